@@ -0,0 +1,173 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# SQLite before 3.36 prints "SCAN TABLE x"; constant rows and materialized
+# subqueries are not table scans.
+_SCAN_PATTERN = re.compile(r"^SCAN (?:TABLE )?(?!CONSTANT ROW|SUBQUERY \d)(\w+)")
+_TEMP_BTREE = "USE TEMP B-TREE"
+
+
+class PlanStep:
+    """
+    A single step of an ``EXPLAIN QUERY PLAN`` tree.
+    """
+
+    def __init__(self, id: int, parent: int, detail: str) -> None:
+        self.id = id
+        self.parent = parent
+        self.detail = detail
+        self.children: List["PlanStep"] = []
+
+    @property
+    def is_full_scan(self) -> bool:
+        return (
+            _SCAN_PATTERN.match(self.detail) is not None
+            and "INDEX" not in self.detail
+            and "VIRTUAL TABLE" not in self.detail
+        )
+
+    @property
+    def uses_temp_btree(self) -> bool:
+        return self.detail.startswith(_TEMP_BTREE)
+
+    @property
+    def table(self) -> Optional[str]:
+        match = _SCAN_PATTERN.match(self.detail)
+        return match.group(1) if match else None
+
+    def walk(self) -> List["PlanStep"]:
+        steps = [self]
+        for child in self.children:
+            steps.extend(child.walk())
+        return steps
+
+    def __repr__(self) -> str:
+        return f"PlanStep({self.id}, {self.parent}, {self.detail!r})"
+
+
+def parse_plan(rows: List[Tuple]) -> List[PlanStep]:
+    steps: Dict[int, PlanStep] = {}
+    roots = []
+    for row in rows:
+        step = PlanStep(row[0], row[1], row[-1])
+        steps[step.id] = step
+        parent = steps.get(step.parent)
+        if parent is None:
+            roots.append(step)
+        else:
+            parent.children.append(step)
+    return roots
+
+
+class QueryShape:
+    """
+    A distinct SQL statement observed by the IndexAdvisor, with its plan.
+    """
+
+    def __init__(self, query: Any, plan: List[PlanStep]) -> None:
+        self.sql = query.query
+        self.table = query.model.__name__
+        self.filter_columns = list(query.filter_columns)
+        self.join_columns = list(query.join_columns)
+        self.order_columns = list(query.order_columns)
+        self.plan = plan
+        self.count = 0
+
+    @property
+    def steps(self) -> List[PlanStep]:
+        return [step for root in self.plan for step in root.walk()]
+
+    @property
+    def full_scans(self) -> List[PlanStep]:
+        return [step for step in self.steps if step.is_full_scan]
+
+    @property
+    def temp_btrees(self) -> List[PlanStep]:
+        return [step for step in self.steps if step.uses_temp_btree]
+
+    @property
+    def flagged(self) -> bool:
+        return bool(self.full_scans or self.temp_btrees)
+
+    def suggest_indexes(self) -> List[str]:
+        tables = {step.table for step in self.full_scans}
+        if self.temp_btrees:
+            tables.update(table for table, _ in self.order_columns)
+
+        suggestions = []
+        for table in sorted(t for t in tables if t):
+            columns = self._index_columns(table)
+            if columns:
+                name = f"idx_{table}_{'_'.join(columns)}"
+                suggestions.append(
+                    f"CREATE INDEX IF NOT EXISTS {name} ON {table} "
+                    f"({', '.join(columns)});"
+                )
+        return suggestions
+
+    def _index_columns(self, table: str) -> List[str]:
+        def on(columns: List[Tuple]) -> List[str]:
+            return [c[1] for c in columns if c[0].lower() == table.lower()]
+
+        equality = [c for c in self.filter_columns if c[2]]
+        ranges = [c for c in self.filter_columns if not c[2]]
+        columns: List[str] = []
+        candidates = (
+            on(equality)
+            + on(self.join_columns)
+            + on(ranges)[:1]
+            + on(self.order_columns)
+        )
+        for column in candidates:
+            if column not in columns:
+                columns.append(column)
+        return columns
+
+    def __repr__(self) -> str:
+        return f"QueryShape({self.sql!r}, count={self.count})"
+
+
+class IndexAdvisor:
+    """
+    Records the distinct query shapes executed through Query and suggests indexes.
+    """
+
+    def __init__(self) -> None:
+        self.shapes: Dict[str, QueryShape] = {}
+        self.registered: List[str] = []
+
+    def observe(self, query: Any) -> QueryShape:
+        shape = self.shapes.get(query.query)
+        if shape is None:
+            shape = self.shapes[query.query] = QueryShape(query, query.explain())
+        shape.count += 1
+        return shape
+
+    def register(self, query: Any) -> QueryShape:
+        shape = self.observe(query)
+        shape.count -= 1
+        if shape.sql not in self.registered:
+            self.registered.append(shape.sql)
+        return shape
+
+    def findings(self) -> List[QueryShape]:
+        return [shape for shape in self.shapes.values() if shape.flagged]
+
+    def suggestions(self) -> List[str]:
+        suggestions: List[str] = []
+        for shape in self.findings():
+            for suggestion in shape.suggest_indexes():
+                if suggestion not in suggestions:
+                    suggestions.append(suggestion)
+        return suggestions
+
+    def assert_no_full_scans(self) -> None:
+        failures = [
+            self.shapes[sql] for sql in self.registered if self.shapes[sql].full_scans
+        ]
+        if failures:
+            details = "; ".join(
+                f"{shape.sql} ({', '.join(s.detail for s in shape.full_scans)})"
+                for shape in failures
+            )
+            raise AssertionError(f"Full table scan in registered queries: {details}")
@@ -1,15 +1,55 @@
-from typing import Any, Dict
-
-from flamel.column import Column
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from flamel.advisor import IndexAdvisor
+from flamel.blob import BlobIO
+from flamel.changes import (
+    OPERATIONS,
+    Change,
+    changelog_compact,
+    changelog_ddl,
+    changelog_table,
+)
+from flamel.column import Blob, Column
 from flamel.dialect import SQLiteDBAPI
-from flamel.query import Query
+from flamel.fulltext import fulltext_ddl, fulltext_rebuild, fulltext_table
+from flamel.maintenance import Maintenance
+from flamel.query import Query, column_alias
+from flamel.replica import HotReplica
+from flamel.row import make_row_class
+from flamel.shard import ShardedEngine
+from flamel.summary import Summary
+from flamel.writer import WriteBehindQueue
 
 
 class Base:
     __registry__: Dict[str, Any] = {}
+    __compact__ = False
+    __changelog__ = False
 
-    def __init_subclass__(cls, **kwargs):
+    def __init_subclass__(
+        cls, compact: bool = False, changelog: bool = False, **kwargs
+    ):
         super().__init_subclass__(**kwargs)
+        if compact and any(
+            isinstance(attr, Column) and attr.deferred for attr in vars(cls).values()
+        ):
+            # Compact rows are read-only tuples with no room to load columns later.
+            raise TypeError(f"Compact model {cls.__name__} cannot defer columns.")
+        cls.__compact__ = compact
+        cls.__changelog__ = changelog
+        cls.__row_classes__: Dict[Tuple[Optional[str], ...], type] = {}
         if cls.__name__ not in Base.__registry__:
             Base.__registry__[cls.__name__] = cls
 
@@ -21,6 +61,110 @@ class Base:
                     value = attr.default
                 setattr(self, name, value)
 
+    @classmethod
+    def attribute_names(cls, columns: Sequence[str]) -> Tuple[Optional[str], ...]:
+        by_column = {
+            attr.name: name
+            for name, attr in vars(cls).items()
+            if isinstance(attr, Column)
+        }
+        names = []
+        for column in columns:
+            alias = column_alias(column)
+            if alias is not None:
+                names.append(by_column.get(alias, alias))
+            else:
+                names.append(by_column.get(column.rpartition(".")[2]))
+        return tuple(names)
+
+    @classmethod
+    def from_row(
+        cls, row: Tuple, names: Optional[Sequence[Optional[str]]] = None
+    ) -> Any:
+        if names is None:
+            names = tuple(
+                name for name, attr in vars(cls).items() if isinstance(attr, Column)
+            )
+        if cls.__compact__:
+            row_class = cls.__row_classes__.get(names)
+            if row_class is None:
+                row_class = cls.__row_classes__[names] = make_row_class(cls, names)
+            return row_class(row)
+
+        instance = cls.__new__(cls)
+        values = instance.__dict__
+        for name, value in zip(names, row):
+            if name is not None:
+                values[name] = value
+
+        primary_key = cls._get_primary_key_name()
+        if primary_key in values:
+            deferred = {
+                name
+                for name, attr in vars(cls).items()
+                if isinstance(attr, Column) and name not in values
+            }
+            if deferred:
+                values["__deferred__"] = deferred
+        return instance
+
+    @classmethod
+    def undefer(
+        cls, instances: Sequence[Any], *names: str, batch: int = 500
+    ) -> None:
+        if cls.__compact__:
+            return
+        primary_key = cls._get_primary_key()
+        primary_key_name = cls._get_primary_key_name()
+        pending = [
+            instance
+            for instance in instances
+            if instance.__dict__.get("__deferred__")
+        ]
+        for start in range(0, len(pending), batch):
+            chunk = pending[start : start + batch]
+            keys = set(names) if names else set()
+            if not names:
+                for instance in chunk:
+                    keys.update(instance.__dict__["__deferred__"])
+            keys = sorted(keys)
+            columns = [cls.__dict__[key].name for key in keys]
+            by_pk = {
+                instance.__dict__[primary_key_name]: instance for instance in chunk
+            }
+            placeholders = ", ".join("?" for _ in by_pk)
+            rows = cls.engine.execute(
+                f"SELECT {primary_key.name}, {', '.join(columns)} "
+                f"FROM {cls.__name__} WHERE {primary_key.name} IN ({placeholders})",
+                list(by_pk),
+            )
+            found = set()
+            for pk, *row in rows:
+                instance = by_pk.get(pk)
+                if instance is None:
+                    continue
+                found.add(pk)
+                values = instance.__dict__
+                for key, value in zip(keys, row):
+                    if key in values["__deferred__"]:
+                        values[key] = value
+                values["__deferred__"].difference_update(keys)
+                if not values["__deferred__"]:
+                    del values["__deferred__"]
+
+            missing = set(by_pk) - found
+            if missing:
+                raise LookupError(
+                    f"No {cls.__name__} rows with primary keys {sorted(missing)!r}."
+                )
+
+    @classmethod
+    def _get_primary_key_name(cls) -> Optional[str]:
+        for name, attr in vars(cls).items():
+            if isinstance(attr, Column) and attr.primary_key:
+                return name
+        return None
+
     @classmethod
     def get_all_models(cls) -> Dict[str, Any]:
         return {name: cls for name, cls in cls.__registry__.items()}
@@ -36,6 +180,15 @@ class Base:
                 "Database engine is not set. Please set the engine before creating tables."
             )
 
+        summaries = [
+            summary
+            for summary in Summary.__registry__.values()
+            if cls.__registry__.get(summary.source.__name__) is summary.source
+        ]
+        if summaries:
+            # Checked before any table is created, so no schema is left half done.
+            cls._require_single_engine("Summary tables")
+
         for model in cls.get_all_models().values():
             columns = []
             foreign_keys = []
@@ -74,6 +227,83 @@ class Base:
             cls.engine.execute(
                 f"CREATE TABLE IF NOT EXISTS {table_name} ({columns_str});"
             )
+            cls._create_fulltext(model)
+            for statement in changelog_ddl(model):
+                cls.engine.execute(statement)
+            if model.__changelog__:
+                cls.engine.add_dependency(table_name, changelog_table(model))
+
+        for summary in summaries:
+            summary.create_table()
+
+    @classmethod
+    def _create_fulltext(cls, model: Any) -> None:
+        statements = fulltext_ddl(model)
+        if not statements:
+            return
+        if isinstance(cls.engine, ShardedEngine):
+            engines = list(cls.engine.shards)
+        else:
+            engines = [cls.engine]
+        for engine in engines:
+            # An external-content index created over existing rows starts
+            # empty, and the delete commands of its triggers would then
+            # corrupt it, so it is rebuilt in the same transaction.
+            with engine.transaction():
+                exists = engine.execute(
+                    "SELECT 1 FROM sqlite_master "
+                    "WHERE type = 'table' AND name = ? COLLATE NOCASE",
+                    [fulltext_table(model)],
+                )
+                for statement in statements:
+                    engine.execute(statement)
+                if not exists:
+                    engine.execute(fulltext_rebuild(model))
+
+    @classmethod
+    def rebuild_fulltext(cls) -> None:
+        cls.engine.execute(fulltext_rebuild(cls))
+
+    @classmethod
+    def changes(cls, since: int = 0, batch: int = 500) -> Iterator[Change]:
+        table = cls._get_changelog_table()
+        while True:
+            rows = cls.engine.execute(
+                f"SELECT seq, op, row_key FROM {table} "
+                "WHERE seq > ? ORDER BY seq LIMIT ?",
+                [since, batch],
+            )
+            for seq, operation, key in rows:
+                yield Change(seq, OPERATIONS[operation], key)
+            if len(rows) < batch:
+                return
+            since = rows[-1][0]
+
+    @classmethod
+    def change_seq(cls) -> int:
+        table = cls._get_changelog_table()
+        result = cls.engine.execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = ?", [table]
+        )
+        return result[0][0] if result else 0
+
+    @classmethod
+    def acknowledge_changes(cls, seq: int) -> None:
+        table = cls._get_changelog_table()
+        cls.engine.execute(f"DELETE FROM {table} WHERE seq <= ?", [seq])
+
+    @classmethod
+    def compact_changes(cls) -> None:
+        cls._get_changelog_table()
+        cls.engine.execute(changelog_compact(cls))
+
+    @classmethod
+    def _get_changelog_table(cls) -> str:
+        # Every shard numbers its own changes, so there is no single sequence.
+        cls._require_single_engine("Change feeds")
+        if not cls.__changelog__:
+            raise ValueError(f"{cls.__name__} does not record changes.")
+        return changelog_table(cls)
 
     @classmethod
     def insert(cls, instance: Any) -> None:
@@ -82,7 +312,8 @@ class Base:
                 "Database engine is not set. Please set the engine before inserting data."
             )
 
-        table_name = instance.__class__.__name__
+        model = getattr(instance, "__model__", None) or instance.__class__
+        table_name = model.__name__
         columns = []
         values = []
 
@@ -90,7 +321,7 @@ class Base:
         primary_key_value = None
         primary_key_autoincrement = False
 
-        for name, attr in instance.__class__.__dict__.items():
+        for name, attr in model.__dict__.items():
             if isinstance(attr, Column):
                 value = getattr(instance, name)
                 if attr.primary_key:
@@ -115,37 +346,211 @@ class Base:
         columns_str = ", ".join(columns)
         placeholders = ", ".join(["?" for _ in values])
 
-        if primary_key_autoincrement:
-            sql_check = f"SELECT COUNT(*) FROM {table_name} WHERE {columns[1]} = ?"
-            result = cls.engine.execute(sql_check, [values[1]])[0][0]
-        elif primary_key_column:
-            sql_check = (
-                f"SELECT COUNT(*) FROM {table_name} WHERE {primary_key_column} = ?"
-            )
-            result = cls.engine.execute(sql_check, [primary_key_value])[0][0]
+        # Models without the shard key are replicated: every shard gets the
+        # row, and every shard decides on its own between insert and update.
+        for engine in cls._engines_for(instance):
+            if primary_key_autoincrement:
+                sql_check = (
+                    f"SELECT COUNT(*) FROM {table_name} WHERE {columns[1]} = ?"
+                )
+                result = engine.execute(sql_check, [values[1]])[0][0]
+            elif primary_key_column:
+                sql_check = (
+                    f"SELECT COUNT(*) FROM {table_name} WHERE {primary_key_column} = ?"
+                )
+                result = engine.execute(sql_check, [primary_key_value])[0][0]
+            else:
+                result = 0
+
+            if result > 0:
+                set_clause = ", ".join([f"{col} = ?" for col in columns])
+                sql_update = (
+                    f"UPDATE {table_name} SET {set_clause} "
+                    f"WHERE {primary_key_column} = ?"
+                )
+                with cls._mirroring(engine, table_name) as replica:
+                    engine.execute(sql_update, values + [primary_key_value])
+                    if replica is not None:
+                        replica.mirror(
+                            table_name,
+                            f"{primary_key_column} = ?",
+                            [primary_key_value],
+                        )
+            else:
+                sql_insert = (
+                    f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
+                )
+                with cls._mirroring(engine, table_name) as replica:
+                    engine.execute(sql_insert, values)
+                    if replica is not None:
+                        replica.mirror_last_insert(table_name)
+
+    @classmethod
+    def _require_single_engine(cls, feature: str) -> None:
+        if isinstance(cls.engine, ShardedEngine):
+            raise NotImplementedError(f"{feature} is not supported on sharded engines.")
+
+    @classmethod
+    def _engines_for(cls, instance: Any) -> List[Any]:
+        if not isinstance(cls.engine, ShardedEngine):
+            return [cls.engine]
+        model = getattr(instance, "__model__", None) or instance.__class__
+        for name, attr in model.__dict__.items():
+            if isinstance(attr, Column) and attr.name == cls.engine.shard_key:
+                return [cls.engine.route(getattr(instance, name))]
+        return list(cls.engine.shards)
+
+    @classmethod
+    @contextmanager
+    def _mirroring(
+        cls, engine: Any, table_name: str
+    ) -> Iterator[Optional[HotReplica]]:
+        replica = getattr(engine, "replica", None)
+        if isinstance(replica, HotReplica) and replica.is_pinned(table_name):
+            with replica.mirroring(table_name):
+                yield replica
         else:
-            result = 0
+            yield None
 
-        if result > 0:
-            set_clause = ", ".join([f"{col} = ?" for col in columns])
-            sql_update = (
-                f"UPDATE {table_name} SET {set_clause} WHERE {primary_key_column} = ?"
-            )
-            cls.engine.execute(sql_update, values + [primary_key_value])
+    @classmethod
+    def enable_index_advisor(cls) -> IndexAdvisor:
+        cls._require_single_engine("The index advisor")
+        if cls.engine.advisor is None:
+            cls.engine.advisor = IndexAdvisor()
+        return cls.engine.advisor
+
+    @classmethod
+    def enable_maintenance(cls, **kwargs: Any) -> Maintenance:
+        cls._require_single_engine("Maintenance")
+        if cls.engine.maintenance is None:
+            cls.engine.maintenance = Maintenance(cls.engine, **kwargs)
+        return cls.engine.maintenance
+
+    @classmethod
+    def pin_in_memory(
+        cls, *models: Any, resync_interval: Optional[float] = None
+    ) -> HotReplica:
+        cls._require_single_engine("In-memory replicas")
+        if cls.engine.replica is None:
+            cls.engine.replica = HotReplica(cls.engine, resync_interval)
+        elif resync_interval is not None:
+            cls.engine.replica.resync_interval = resync_interval
+        cls.engine.replica.pin(*models)
+        return cls.engine.replica
+
+    @classmethod
+    def open_blob(cls, pk: Any, column: str, mode: str = "r") -> BlobIO:
+        if mode not in ("r", "w"):
+            raise ValueError("mode must be 'r' or 'w'")
+        cls._require_single_engine("Incremental blob I/O")
+        attr = cls._get_blob_column(column)
+        rowid = cls._get_rowid(pk)
+        blob = cls.engine.blobopen(
+            cls.__name__, attr.name, rowid, readonly=mode == "r"
+        )
+        # Blob writes bypass execute, so cached results and replicas of the
+        # table are invalidated when the stream is closed.
+        return BlobIO(
+            blob,
+            writable=mode == "w",
+            on_write=lambda: cls.engine.bump_version(cls.__name__),
+        )
+
+    @classmethod
+    def write_blob(
+        cls,
+        pk: Any,
+        column: str,
+        data: Union[Any, Iterable[bytes]],
+        size: int,
+        chunk_size: int = 65536,
+    ) -> None:
+        cls._require_single_engine("Incremental blob I/O")
+        attr = cls._get_blob_column(column)
+        primary_key = cls._get_primary_key()
+
+        if hasattr(data, "read"):
+            chunks = iter(lambda: data.read(chunk_size), b"")
         else:
-            sql_insert = (
-                f"INSERT INTO {table_name} ({columns_str}) VALUES ({placeholders})"
+            chunks = data
+
+        with cls.engine.transaction():
+            cls.engine.execute(
+                f"UPDATE {cls.__name__} SET {attr.name} = zeroblob(?) "
+                f"WHERE {primary_key.name} = ?",
+                [size, pk],
             )
-            cls.engine.execute(sql_insert, values)
+            written = 0
+            with cls.open_blob(pk, column, mode="w") as stream:
+                for chunk in chunks:
+                    if written + len(chunk) > size:
+                        raise ValueError(
+                            "Blob data is larger than the reserved size."
+                        )
+                    written += stream.write(chunk)
+            if written != size:
+                raise ValueError(
+                    f"Blob data is {written} bytes but {size} bytes were reserved."
+                )
+        cls.engine.bump_version(cls.__name__)
 
     @classmethod
-    def set_engine(cls, engine: str) -> None:
-        cls.engine = SQLiteDBAPI(engine)
+    def _get_primary_key(cls) -> Column:
+        for attr in cls.__dict__.values():
+            if isinstance(attr, Column) and attr.primary_key:
+                return attr
+        raise ValueError(f"{cls.__name__} has no primary key column.")
+
+    @classmethod
+    def _get_blob_column(cls, column: str) -> Column:
+        attr = cls.__dict__.get(column)
+        if not isinstance(attr, Column):
+            raise AttributeError(f"{cls.__name__} has no column '{column}'.")
+        if not issubclass(attr.data_type, Blob):
+            raise TypeError(f"Column '{column}' is not a Blob column.")
+        return attr
+
+    @classmethod
+    def _get_rowid(cls, pk: Any) -> int:
+        primary_key = cls._get_primary_key()
+        result = cls.engine.execute(
+            f"SELECT rowid FROM {cls.__name__} WHERE {primary_key.name} = ?", [pk]
+        )
+        if not result:
+            raise LookupError(f"No {cls.__name__} row with primary key {pk!r}.")
+        return result[0][0]
+
+    @classmethod
+    def write_behind(cls, **kwargs: Any) -> WriteBehindQueue:
+        if not hasattr(cls, "engine") or cls.engine is None:
+            raise AttributeError(
+                "Database engine is not set. Please set the engine before inserting data."
+            )
+        cls._require_single_engine("Write-behind inserts")
+        return WriteBehindQueue(cls, **kwargs)
+
+    @classmethod
+    def set_engine(cls, engine: str, **options: Any) -> None:
+        cls.engine = SQLiteDBAPI(engine, **options)
+
+    @classmethod
+    def set_sharded_engine(
+        cls,
+        databases: Sequence[str],
+        shard_key: str,
+        router: Optional[Callable[[Any, int], int]] = None,
+        **options: Any,
+    ) -> None:
+        cls.engine = ShardedEngine(databases, shard_key, router, **options)
 
     @classmethod
     def engine_close(cls) -> None:
         cls.engine.close()
 
+    @classmethod
+    def engine_dispose(cls) -> None:
+        cls.engine.dispose()
+
     @classmethod
     def query(cls) -> Query:
         return Query(cls, cls.engine)
@@ -0,0 +1,73 @@
+import io
+from typing import Any, Callable, Optional
+
+
+class BlobIO(io.RawIOBase):
+    """
+    File-like, seekable stream over a single BLOB value using SQLite incremental I/O.
+    """
+
+    def __init__(
+        self,
+        blob: Any,
+        writable: bool = False,
+        on_write: Optional[Callable[[], None]] = None,
+    ) -> None:
+        """
+        Initializes a new instance of the BlobIO class.
+
+        Args:
+            blob (sqlite3.Blob): The blob handle returned by Connection.blobopen.
+            writable (bool, optional): A boolean indicating if the stream accepts writes. Defaults to False.
+            on_write (Callable[[], None], optional): A function called when a stream that was written to is closed. Defaults to None.
+        """
+        super().__init__()
+        self._blob = blob
+        self._writable = writable
+        self._on_write = on_write
+        self._written = False
+
+    def __len__(self) -> int:
+        return len(self._blob)
+
+    def readable(self) -> bool:
+        return True
+
+    def writable(self) -> bool:
+        return self._writable
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        self._checkClosed()
+        view = memoryview(buffer).cast("B")
+        data = self._blob.read(len(view))
+        size = len(data)
+        view[:size] = data
+        return size
+
+    def write(self, data: Any) -> int:
+        self._checkClosed()
+        if not self._writable:
+            raise io.UnsupportedOperation("Blob was opened in read mode.")
+        view = memoryview(data).cast("B")
+        self._blob.write(view)
+        self._written = True
+        return len(view)
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        self._checkClosed()
+        self._blob.seek(offset, whence)
+        return self._blob.tell()
+
+    def tell(self) -> int:
+        self._checkClosed()
+        return self._blob.tell()
+
+    def close(self) -> None:
+        if not self.closed:
+            self._blob.close()
+            if self._written and self._on_write is not None:
+                self._on_write()
+        super().close()
@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Set, Tuple
+
+
+class QueryCache:
+    """
+    LRU cache of query results, invalidated through per-table version counters.
+    """
+
+    def __init__(self, max_entries: int = 1024) -> None:
+        """
+        Initializes a new instance of the QueryCache class.
+
+        Args:
+            max_entries (int, optional): The maximum number of cached results kept before the least recently used one is evicted. Defaults to 1024.
+
+        Raises:
+            ValueError: If max_entries is lower than 1.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be greater than 0")
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[Any, ...]]" = OrderedDict()
+        self._by_table: Dict[str, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        # Writers invalidate entries from their own threads while readers look
+        # them up, so the entries and the table index change under one lock.
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, versions: Dict[str, int]) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            expires_at, cached_versions, result = entry
+            stale = any(
+                versions.get(table, 0) != version
+                for table, version in cached_versions.items()
+            )
+            if stale or (expires_at is not None and expires_at <= time.monotonic()):
+                self._discard(key)
+                self.misses += 1
+                return False, None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, result
+
+    def set(
+        self,
+        key: Hashable,
+        tables: Iterable[str],
+        versions: Dict[str, int],
+        result: Any,
+        ttl: Optional[float] = None,
+    ) -> None:
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        cached_versions = {table: versions.get(table, 0) for table in tables}
+        with self._lock:
+            if key in self._entries:
+                self._discard(key)
+
+            self._entries[key] = (expires_at, cached_versions, result)
+            for table in cached_versions:
+                self._by_table.setdefault(table, set()).add(key)
+
+            while len(self._entries) > self.max_entries:
+                self._discard(next(iter(self._entries)))
+
+    def invalidate(self, table: str) -> None:
+        with self._lock:
+            for key in self._by_table.pop(table, set()):
+                self._discard(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_table.clear()
+
+    def _discard(self, key: Hashable) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for table in entry[1]:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,58 @@
+from typing import Any, List, NamedTuple
+
+from flamel.column import Column
+
+OPERATIONS = {"I": "insert", "U": "update", "D": "delete"}
+
+
+class Change(NamedTuple):
+    seq: int
+    operation: str
+    key: Any
+
+
+def changelog_table(model: Any) -> str:
+    return f"{model.__name__}_changes"
+
+
+def changelog_key(model: Any) -> str:
+    for attr in model.__dict__.values():
+        if isinstance(attr, Column) and attr.primary_key:
+            return attr.name
+    return "rowid"
+
+
+def changelog_ddl(model: Any) -> List[str]:
+    if not getattr(model, "__changelog__", False):
+        return []
+
+    table = model.__name__
+    changes = changelog_table(model)
+    key = changelog_key(model)
+
+    def append(operation: str, row: str) -> str:
+        return (
+            f"INSERT INTO {changes} (op, row_key) "
+            f"VALUES ('{operation}', {row}.{key});"
+        )
+
+    return [
+        f"CREATE TABLE IF NOT EXISTS {changes} (seq INTEGER PRIMARY KEY "
+        "AUTOINCREMENT, op TEXT NOT NULL, row_key NOT NULL);",
+        f"CREATE TRIGGER IF NOT EXISTS {changes}_ai AFTER INSERT ON {table} "
+        f"BEGIN {append('I', 'new')} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {changes}_ad AFTER DELETE ON {table} "
+        f"BEGIN {append('D', 'old')} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {changes}_au AFTER UPDATE ON {table} "
+        f"BEGIN {append('U', 'new')} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {changes}_ak AFTER UPDATE ON {table} "
+        f"WHEN old.{key} IS NOT new.{key} BEGIN {append('D', 'old')} END;",
+    ]
+
+
+def changelog_compact(model: Any) -> str:
+    changes = changelog_table(model)
+    return (
+        f"DELETE FROM {changes} WHERE seq NOT IN "
+        f"(SELECT MAX(seq) FROM {changes} GROUP BY row_key)"
+    )
@@ -1,5 +1,13 @@
 from datetime import datetime
-from typing import Union
+from typing import Any, Iterable, Union
+
+from flamel.expression import (
+    BetweenExpression,
+    BinaryExpression,
+    Expression,
+    InExpression,
+    UnaryExpression,
+)
 
 
 class Integer(int):
@@ -66,6 +74,8 @@ class Column:
         check: str = None,
         autoincrement: bool = False,
         foreign_key: ForeignKey = None,
+        fulltext: bool = False,
+        deferred: bool = False,
     ) -> None:
         """
         Initializes a new instance of the Column class with the specified properties.
@@ -80,12 +90,16 @@ class Column:
             check (str, optional): A string representing a check constraint for the column. Defaults to None.
             autoincrement (bool, optional): A boolean indicating if the column has auto-incrementing values. Defaults to False.
             foreign_key (ForeignKey, optional): A ForeignKey object representing a foreign key constraint. Defaults to None.
+            fulltext (bool, optional): A boolean indicating if the column is indexed in an FTS5 full-text table. Defaults to False.
+            deferred (bool, optional): A boolean indicating if the column is left out of queries and loaded on first access. Defaults to False.
 
         Raises:
             TypeError: If data_type is not a type.
             ValueError: If default value is not of the same type as data_type.
             TypeError: If check is not a string.
             TypeError: If foreign_key is not a ForeignKey object.
+            TypeError: If fulltext is set on a column that is not a String.
+            ValueError: If deferred is set on a primary key column.
         """
         self.name = name
         if not isinstance(data_type, type) or not issubclass(
@@ -116,9 +130,79 @@ class Column:
         if foreign_key is not None and not isinstance(foreign_key, ForeignKey):
             raise TypeError("foreign_key must be a ForeignKey object")
         self.foreign_key = foreign_key
+        if fulltext and not issubclass(self.data_type, String):
+            raise TypeError("fulltext is only supported on String columns")
+        self.fulltext = fulltext
+        if deferred and primary_key:
+            raise ValueError("primary key columns cannot be deferred")
+        self.deferred = deferred
+
+    def __set_name__(self, owner: type, name: str) -> None:
+        self.table = owner.__name__
+        self.key = name
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        pending = instance.__dict__.get("__deferred__")
+        if pending and getattr(self, "key", None) in pending:
+            owner.undefer([instance], self.key)
+            return instance.__dict__[self.key]
+        return self
+
+    __hash__ = object.__hash__
+
+    def __eq__(self, other: Any) -> Expression:  # type: ignore[override]
+        if other is None:
+            return UnaryExpression(self, "IS NULL")
+        return BinaryExpression(self, "=", other)
+
+    def __ne__(self, other: Any) -> Expression:  # type: ignore[override]
+        if other is None:
+            return UnaryExpression(self, "IS NOT NULL")
+        return BinaryExpression(self, "!=", other)
+
+    def __lt__(self, other: Any) -> Expression:
+        return BinaryExpression(self, "<", other)
+
+    def __le__(self, other: Any) -> Expression:
+        return BinaryExpression(self, "<=", other)
+
+    def __gt__(self, other: Any) -> Expression:
+        return BinaryExpression(self, ">", other)
+
+    def __ge__(self, other: Any) -> Expression:
+        return BinaryExpression(self, ">=", other)
+
+    def like(self, pattern: str) -> Expression:
+        return BinaryExpression(self, "LIKE", pattern)
+
+    def not_like(self, pattern: str) -> Expression:
+        return BinaryExpression(self, "NOT LIKE", pattern)
+
+    def in_(self, values: Iterable[Any]) -> Expression:
+        return InExpression(self, values)
+
+    def not_in(self, values: Iterable[Any]) -> Expression:
+        return InExpression(self, values, negate=True)
+
+    def between(self, lower: Any, upper: Any) -> Expression:
+        return BetweenExpression(self, lower, upper)
+
+    def is_(self, value: Any) -> Expression:
+        if value is None:
+            return UnaryExpression(self, "IS NULL")
+        return BinaryExpression(self, "IS", value)
+
+    def is_not(self, value: Any) -> Expression:
+        if value is None:
+            return UnaryExpression(self, "IS NOT NULL")
+        return BinaryExpression(self, "IS NOT", value)
 
     def __repr__(self) -> str:
         attrs = [
-            f"{key}={getattr(self, key)}" for key in self.__dict__ if key != "data_type"
+            f"{key}={getattr(self, key)}"
+            for key in self.__dict__
+            if key not in ("data_type", "table", "key")
         ]
         return f"Column({self.name}, {self.data_type.__name__}, {', '.join(attrs)})"
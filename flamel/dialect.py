@@ -1,37 +1,403 @@
+import os
+import random
+import re
 import sqlite3
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set
+
+# A write starts a line, follows another statement or closes a CTE.
+_WRITE_PATTERN = re.compile(
+    r"(?:^|[;)])\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|REPLACE\s+INTO|UPDATE(?:\s+OR\s+\w+)?"
+    r"|DELETE\s+FROM)\s+(?:\w+\.)?[\"`\[]?(\w+)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+_PRAGMA_ASSIGNMENT = re.compile(
+    r"^\s*PRAGMA\s+(?:main\.)?(\w+)\s*=\s*(.+?)\s*;?\s*$", re.IGNORECASE
+)
+
+_PROGRESS_INSTRUCTIONS = 1000
+
+# Connections inherited across fork() are never closed in the child: closing
+# one would roll back the parent's open transaction or, as the last connection
+# it knows of, checkpoint and delete the WAL files the parent is still using.
+_abandoned: List[sqlite3.Connection] = []
+
+_engines: "weakref.WeakSet[SQLiteDBAPI]" = weakref.WeakSet()
+
+
+def _after_fork() -> None:
+    for engine in list(_engines):
+        engine.lock = threading.RLock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def written_tables(sql: str) -> List[str]:
+    return [table.lower() for table in _WRITE_PATTERN.findall(sql)]
+
+
+class QueryInterrupted(sqlite3.OperationalError):
+    """
+    Raised when a running statement is cancelled before it completes.
+    """
+
+
+class QueryTimeout(QueryInterrupted):
+    """
+    Raised when a running statement exceeds its deadline.
+    """
+
+
+class RetryPolicy:
+    """
+    Jittered exponential backoff for statements failing with a busy or locked database.
+    """
+
+    def __init__(
+        self,
+        max_attempts: int = 5,
+        base_delay: float = 0.01,
+        max_delay: float = 1.0,
+    ) -> None:
+        """
+        Initializes a new instance of the RetryPolicy class.
+
+        Args:
+            max_attempts (int, optional): The maximum number of times a statement is run before giving up. Defaults to 5.
+            base_delay (float, optional): The upper bound in seconds of the first backoff delay, doubled on every retry. Defaults to 0.01.
+            max_delay (float, optional): The upper bound in seconds of any backoff delay. Defaults to 1.0.
+
+        Raises:
+            ValueError: If max_attempts is lower than 1.
+        """
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be greater than 0")
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @staticmethod
+    def is_retryable(error: Exception) -> bool:
+        message = str(error).lower()
+        return "database is locked" in message or "database is busy" in message
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class ContentionStats:
+    """
+    Counters of the retries caused by write contention on an engine.
+    """
+
+    def __init__(self) -> None:
+        self.retries = 0
+        self.wait_time = 0.0
+        self.give_ups = 0
+
+    def reset(self) -> None:
+        self.__init__()
+
+    def __repr__(self) -> str:
+        return (
+            f"ContentionStats(retries={self.retries}, "
+            f"wait_time={self.wait_time:.3f}, give_ups={self.give_ups})"
+        )
 
 
 class SQLiteDBAPI:
-    def __init__(self, database):
-        self.conn = sqlite3.connect(database)
-        if self.conn is not None:
-            self.cursor = self.conn.cursor()
-        else:
+    def __init__(
+        self,
+        database,
+        busy_timeout: float = 5.0,
+        retry_policy: Optional[RetryPolicy] = None,
+        statement_timeout: Optional[float] = None,
+        pragmas: Optional[Dict[str, Any]] = None,
+        cached_statements: int = 128,
+    ):
+        self.database = database
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.contention = ContentionStats()
+        self.statement_timeout = statement_timeout
+        self.pragmas: Dict[str, Any] = dict(pragmas or {})
+        self._connect_options = {
+            "timeout": busy_timeout,
+            "isolation_level": "IMMEDIATE",
+            "check_same_thread": False,
+            "cached_statements": cached_statements,
+        }
+        self._expired = False
+        self.table_versions: Dict[str, int] = {}
+        self.modified_rows: Dict[str, int] = {}
+        self.dependencies: Dict[str, Set[str]] = {}
+        self.query_cache = None
+        self.replica = None
+        self.advisor = None
+        self.maintenance = None
+        self.lock = threading.RLock()
+        self._transaction_depth = 0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._cursor: Optional[sqlite3.Cursor] = None
+        self._pid: Optional[int] = None
+        self._opened = False
+        self._connect()
+        _engines.add(self)
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            with self.lock:
+                if self._pid != os.getpid():
+                    self._connect()
+        return self._conn
+
+    @property
+    def cursor(self) -> sqlite3.Cursor:
+        self.conn
+        return self._cursor
+
+    @property
+    def in_memory(self) -> bool:
+        return self.database in ("", ":memory:")
+
+    def _connect(self):
+        inherited = self._conn is not None
+        reopened = self._opened
+        if inherited and self.in_memory:
+            # A private copy of an in-memory database shares no files with the
+            # parent and cannot be reopened, so the child keeps using it.
+            self._pid = os.getpid()
+            return
+        if inherited:
+            _abandoned.append(self._conn)
+
+        self._conn = sqlite3.connect(self.database, **self._connect_options)
+        if self._conn is None:
             raise Exception("Failed to connect to the database.")
+        self._cursor = self._conn.cursor()
+        self._pid = os.getpid()
+        self._transaction_depth = 0
+        for name, value in self.pragmas.items():
+            self._cursor.execute(f"PRAGMA {name} = {value}")
+        self._opened = True
+        # Whether inherited or disposed, the previous connection took the
+        # attached replica with it and may have missed other writers.
+        if reopened:
+            if self.query_cache is not None:
+                self.query_cache.clear()
+            if self.replica is not None:
+                self.replica.reattach()
 
-    def execute(self, sql, parameters=()):
-        try:
+    def dispose(self):
+        if self.in_memory:
+            # Closing the only connection to an in-memory database would
+            # discard its content, so it is kept.
+            return
+        with self.lock:
+            if self._conn is not None:
+                if self._pid == os.getpid():
+                    self._conn.close()
+                else:
+                    _abandoned.append(self._conn)
+            self._conn = None
+            self._cursor = None
+            self._pid = None
+            if self.query_cache is not None:
+                self.query_cache.clear()
+
+    def execute(self, sql, parameters=(), timeout=None, cancel=None):
+        def run():
             self.cursor.execute(sql, parameters)
-            self.commit()
+            self._autocommit()
             return self.cursor.fetchall()
-        except sqlite3.Error as e:
-            self.rollback()
-            raise sqlite3.OperationalError(e) from e
 
-    def executemany(self, sql, parameters):
+        with self.lock, self._deadline(timeout, cancel):
+            changes = self.conn.total_changes
+            result = self._retry(run)
+            self._track_writes(sql, self.conn.total_changes - changes)
+            self._remember_pragma(sql)
+            return result
+
+    def iterate(self, sql, parameters=(), size=1000, timeout=None, cancel=None):
+        # The lock and the deadline cover each fetch rather than the whole
+        # iteration, so other queries run while the consumer is busy, and the
+        # rows come from a dedicated cursor that their statements do not reset.
+        with self.lock, self._deadline(timeout, cancel):
+            cursor = self.conn.cursor()
+            self._retry(lambda: cursor.execute(sql, parameters))
         try:
+            while True:
+                with self.lock, self._deadline(timeout, cancel):
+                    rows = self._retry(lambda: cursor.fetchmany(size))
+                if not rows:
+                    return
+                yield rows
+        finally:
+            with self.lock:
+                cursor.close()
+
+    def executemany(self, sql, parameters):
+        parameters = list(parameters)
+
+        def run():
             self.cursor.executemany(sql, parameters)
-            self.commit()
-        except sqlite3.Error as e:
-            self.rollback()
-            raise sqlite3.OperationalError(e) from e
+            self._autocommit()
+
+        with self.lock:
+            changes = self.conn.total_changes
+            self._retry(run)
+            self._track_writes(sql, self.conn.total_changes - changes)
 
     def executescript(self, sql):
-        try:
+        def run():
             self.cursor.executescript(sql)
             self.commit()
-        except sqlite3.Error as e:
+
+        with self.lock:
+            if self._transaction_depth:
+                raise sqlite3.OperationalError(
+                    "executescript cannot run inside a transaction."
+                )
+            changes = self.conn.total_changes
+            self._retry(run)
+            self._track_writes(sql, self.conn.total_changes - changes)
+
+    def _retry(self, operation):
+        attempt = 0
+        while True:
+            try:
+                return operation()
+            except sqlite3.Error as e:
+                self._autorollback()
+                if "interrupted" in str(e):
+                    if self._expired:
+                        raise QueryTimeout("Statement exceeded its deadline.") from e
+                    raise QueryInterrupted("Statement was cancelled.") from e
+                retryable = self.retry_policy.is_retryable(e)
+                attempt += 1
+                if (
+                    not retryable
+                    or self._transaction_depth
+                    or attempt >= self.retry_policy.max_attempts
+                ):
+                    if retryable:
+                        self.contention.give_ups += 1
+                    raise sqlite3.OperationalError(e) from e
+                delay = self.retry_policy.delay(attempt - 1)
+                self.contention.retries += 1
+                self.contention.wait_time += delay
+                time.sleep(delay)
+
+    @contextmanager
+    def _deadline(self, timeout, cancel):
+        if timeout is None:
+            timeout = self.statement_timeout
+        if timeout is None and cancel is None:
+            yield
+            return
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        def check():
+            if deadline is not None and time.monotonic() >= deadline:
+                self._expired = True
+                return 1
+            return 1 if cancel is not None and cancel.is_set() else 0
+
+        if cancel is not None and cancel.is_set():
+            raise QueryInterrupted("Statement was cancelled.")
+        self.conn.set_progress_handler(check, _PROGRESS_INSTRUCTIONS)
+        try:
+            yield
+        finally:
+            self.conn.set_progress_handler(None, 0)
+            self._expired = False
+
+    def interrupt(self):
+        self.conn.interrupt()
+
+    @contextmanager
+    def transaction(self):
+        with self.lock:
+            outermost = self._transaction_depth == 0
+            if outermost:
+                self._retry(lambda: self.cursor.execute("BEGIN IMMEDIATE"))
+            self._transaction_depth += 1
+            try:
+                yield self
+            except BaseException:
+                self._transaction_depth -= 1
+                if outermost:
+                    self.rollback()
+                raise
+            self._transaction_depth -= 1
+            if outermost:
+                try:
+                    self.commit()
+                except sqlite3.Error as e:
+                    self.rollback()
+                    raise sqlite3.OperationalError(e) from e
+
+    @contextmanager
+    def savepoint(self, name="flamel_savepoint"):
+        with self.transaction():
+            self.cursor.execute(f"SAVEPOINT {name}")
+            try:
+                yield self
+            except BaseException:
+                self.cursor.execute(f"ROLLBACK TO {name}")
+                self.cursor.execute(f"RELEASE {name}")
+                raise
+            self.cursor.execute(f"RELEASE {name}")
+
+    def _autocommit(self):
+        if not self._transaction_depth:
+            self.commit()
+
+    def _autorollback(self):
+        if not self._transaction_depth:
             self.rollback()
+
+    def bump_version(self, table):
+        table = table.lower()
+        self.table_versions[table] = self.table_versions.get(table, 0) + 1
+        if self.query_cache is not None:
+            self.query_cache.invalidate(table)
+        if self.replica is not None:
+            self.replica.invalidate(table)
+        for dependent in self.dependencies.get(table, ()):
+            self.bump_version(dependent)
+
+    def add_dependency(self, table, dependent):
+        self.dependencies.setdefault(table.lower(), set()).add(dependent.lower())
+
+    def _remember_pragma(self, sql):
+        match = _PRAGMA_ASSIGNMENT.match(sql)
+        if match:
+            self.pragmas[match.group(1).lower()] = match.group(2)
+
+    def _track_writes(self, sql, changes=0):
+        # Rows changed by a script are counted against each table it writes,
+        # which overestimates rather than misses changes.
+        for table in set(written_tables(sql)):
+            self.bump_version(table)
+            self.modified_rows[table] = self.modified_rows.get(table, 0) + changes
+
+    def blobopen(self, table, column, row, readonly=True):
+        if not hasattr(self.conn, "blobopen"):
+            raise NotImplementedError(
+                "Incremental blob I/O requires Python 3.11 or newer."
+            )
+        try:
+            return self.conn.blobopen(table, column, row, readonly=readonly)
+        except sqlite3.Error as e:
             raise sqlite3.OperationalError(e) from e
 
     def commit(self):
@@ -41,7 +407,12 @@ class SQLiteDBAPI:
         self.conn.rollback()
 
     def close(self):
-        self.conn.close()
+        if self.maintenance is not None:
+            self.maintenance.close()
+        if self._pid == os.getpid():
+            self._conn.close()
+        else:
+            self.dispose()
 
     def fetchone(self):
         return self.cursor.fetchone()
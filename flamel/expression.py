@@ -0,0 +1,277 @@
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+_compiled: Dict[Hashable, str] = {}
+_MAX_COMPILED = 4096
+
+
+class Expression:
+    """
+    Base class of the SQL expressions built from class-level Column attributes.
+    """
+
+    def shape(self) -> Hashable:
+        raise NotImplementedError
+
+    def params(self) -> List[Any]:
+        raise NotImplementedError
+
+    def to_sql(self) -> str:
+        raise NotImplementedError
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return []
+
+    def tables(self) -> List[str]:
+        return []
+
+    def compile(self) -> Tuple[str, List[Any]]:
+        shape = self.shape()
+        sql = _compiled.get(shape)
+        if sql is None:
+            if len(_compiled) >= _MAX_COMPILED:
+                _compiled.clear()
+            sql = _compiled[shape] = self.to_sql()
+        return sql, self.params()
+
+    def __and__(self, other: "Expression") -> "Expression":
+        return and_(self, other)
+
+    def __or__(self, other: "Expression") -> "Expression":
+        return or_(self, other)
+
+    def __invert__(self) -> "Expression":
+        return not_(self)
+
+    def __bool__(self) -> bool:
+        raise TypeError(
+            "Expressions cannot be used as booleans, use &, | and ~ or and_, "
+            "or_ and not_ instead."
+        )
+
+    def __repr__(self) -> str:
+        sql, params = self.compile()
+        return f"{sql}, {params}" if params else sql
+
+
+def column_sql(column: Any) -> str:
+    table = getattr(column, "table", None)
+    return f"{table}.{column.name}" if table else column.name
+
+
+def _is_column(value: Any) -> bool:
+    return hasattr(value, "data_type") and hasattr(value, "name")
+
+
+def coerce_clause(value: Any) -> Any:
+    clause_element = getattr(value, "__clause_element__", None)
+    return clause_element() if clause_element is not None else value
+
+
+class Subquery(Expression):
+    """
+    A compiled Query used as a value, either as a scalar or as the operand of IN.
+    """
+
+    def __init__(
+        self,
+        sql: str,
+        values: List[Any],
+        alias: Optional[str] = None,
+        tables: Sequence[str] = (),
+    ):
+        self.sql = sql
+        self.values = list(values)
+        self.alias = alias
+        self._tables = list(tables)
+
+    def label(self, alias: str) -> "Subquery":
+        return Subquery(self.sql, self.values, alias, self._tables)
+
+    def tables(self) -> List[str]:
+        return list(self._tables)
+
+    def shape(self) -> Hashable:
+        return ("subquery", self.sql)
+
+    def params(self) -> List[Any]:
+        return self.values
+
+    def to_sql(self) -> str:
+        return f"({self.sql})"
+
+    def __str__(self) -> str:
+        sql = self.to_sql()
+        return f"{sql} AS {self.alias}" if self.alias else sql
+
+
+class BinaryExpression(Expression):
+    def __init__(self, column: Any, operator: str, value: Any) -> None:
+        self.column = column
+        self.operator = operator
+        self.value = coerce_clause(value)
+
+    def shape(self) -> Hashable:
+        if isinstance(self.value, Expression):
+            return (
+                "binary",
+                column_sql(self.column),
+                self.operator,
+                self.value.shape(),
+            )
+        if _is_column(self.value):
+            return (
+                "binary",
+                column_sql(self.column),
+                self.operator,
+                column_sql(self.value),
+            )
+        return ("binary", column_sql(self.column), self.operator)
+
+    def params(self) -> List[Any]:
+        if isinstance(self.value, Expression):
+            return self.value.params()
+        return [] if _is_column(self.value) else [self.value]
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [(self.column, self.operator in ("=", "IS"))]
+
+    def tables(self) -> List[str]:
+        return self.value.tables() if isinstance(self.value, Expression) else []
+
+    def to_sql(self) -> str:
+        if isinstance(self.value, Expression):
+            right = self.value.to_sql()
+        elif _is_column(self.value):
+            right = column_sql(self.value)
+        else:
+            right = "?"
+        return f"{column_sql(self.column)} {self.operator} {right}"
+
+
+class UnaryExpression(Expression):
+    def __init__(self, column: Any, operator: str) -> None:
+        self.column = column
+        self.operator = operator
+
+    def shape(self) -> Hashable:
+        return ("unary", column_sql(self.column), self.operator)
+
+    def params(self) -> List[Any]:
+        return []
+
+    def to_sql(self) -> str:
+        return f"{column_sql(self.column)} {self.operator}"
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [(self.column, self.operator == "IS NULL")]
+
+
+class InExpression(Expression):
+    def __init__(self, column: Any, values: Any, negate: bool = False) -> None:
+        self.column = column
+        values = coerce_clause(values)
+        self.subquery = values if isinstance(values, Subquery) else None
+        if self.subquery is not None:
+            self.values = self.subquery.params()
+        else:
+            self.values = list(values)
+        self.negate = negate
+
+    def shape(self) -> Hashable:
+        if self.subquery is not None:
+            operand: Hashable = self.subquery.shape()
+        else:
+            operand = len(self.values)
+        return ("in", column_sql(self.column), operand, self.negate)
+
+    def params(self) -> List[Any]:
+        return self.values
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [(self.column, not self.negate)]
+
+    def tables(self) -> List[str]:
+        return self.subquery.tables() if self.subquery is not None else []
+
+    def to_sql(self) -> str:
+        operator = "NOT IN" if self.negate else "IN"
+        if self.subquery is not None:
+            return f"{column_sql(self.column)} {operator} {self.subquery.to_sql()}"
+        placeholders = ", ".join("?" for _ in self.values)
+        return f"{column_sql(self.column)} {operator} ({placeholders})"
+
+
+class BetweenExpression(Expression):
+    def __init__(self, column: Any, lower: Any, upper: Any) -> None:
+        self.column = column
+        self.lower = lower
+        self.upper = upper
+
+    def shape(self) -> Hashable:
+        return ("between", column_sql(self.column))
+
+    def params(self) -> List[Any]:
+        return [self.lower, self.upper]
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [(self.column, False)]
+
+    def to_sql(self) -> str:
+        return f"{column_sql(self.column)} BETWEEN ? AND ?"
+
+
+class BooleanExpression(Expression):
+    def __init__(self, operator: str, *clauses: Expression) -> None:
+        if not clauses:
+            raise ValueError(f"{operator} requires at least one expression")
+        self.operator = operator
+        self.clauses = clauses
+
+    def shape(self) -> Hashable:
+        return (self.operator, tuple(clause.shape() for clause in self.clauses))
+
+    def params(self) -> List[Any]:
+        return [value for clause in self.clauses for value in clause.params()]
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [column for clause in self.clauses for column in clause.columns()]
+
+    def tables(self) -> List[str]:
+        return [table for clause in self.clauses for table in clause.tables()]
+
+    def to_sql(self) -> str:
+        if len(self.clauses) == 1:
+            return self.clauses[0].to_sql()
+        return f" {self.operator} ".join(f"({c.to_sql()})" for c in self.clauses)
+
+
+class NotExpression(Expression):
+    def __init__(self, clause: Expression) -> None:
+        self.clause = clause
+
+    def shape(self) -> Hashable:
+        return ("NOT", self.clause.shape())
+
+    def params(self) -> List[Any]:
+        return self.clause.params()
+
+    def columns(self) -> List[Tuple[Any, bool]]:
+        return [(column, False) for column, _ in self.clause.columns()]
+
+    def tables(self) -> List[str]:
+        return self.clause.tables()
+
+    def to_sql(self) -> str:
+        return f"NOT ({self.clause.to_sql()})"
+
+
+def and_(*clauses: Expression) -> Expression:
+    return BooleanExpression("AND", *clauses)
+
+
+def or_(*clauses: Expression) -> Expression:
+    return BooleanExpression("OR", *clauses)
+
+
+def not_(clause: Expression) -> Expression:
+    return NotExpression(clause)
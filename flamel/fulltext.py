@@ -0,0 +1,47 @@
+from typing import Any, List
+
+from flamel.column import Column
+
+
+def fulltext_table(model: Any) -> str:
+    return f"{model.__name__}_fts"
+
+
+def fulltext_columns(model: Any) -> List[str]:
+    return [
+        attr.name
+        for attr in model.__dict__.values()
+        if isinstance(attr, Column) and attr.fulltext
+    ]
+
+
+def fulltext_ddl(model: Any) -> List[str]:
+    columns = fulltext_columns(model)
+    if not columns:
+        return []
+
+    table = model.__name__
+    fts = fulltext_table(model)
+    names = ", ".join(columns)
+    new_values = ", ".join(f"new.{column}" for column in columns)
+    old_values = ", ".join(f"old.{column}" for column in columns)
+    insert = f"INSERT INTO {fts} (rowid, {names}) VALUES (new.rowid, {new_values});"
+    delete = (
+        f"INSERT INTO {fts} ({fts}, rowid, {names}) "
+        f"VALUES ('delete', old.rowid, {old_values});"
+    )
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({names}, "
+        f"content='{table}', content_rowid='rowid');",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} "
+        f"BEGIN {insert} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} "
+        f"BEGIN {delete} END;",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE ON {table} "
+        f"BEGIN {delete} {insert} END;",
+    ]
+
+
+def fulltext_rebuild(model: Any) -> str:
+    fts = fulltext_table(model)
+    return f"INSERT INTO {fts} ({fts}) VALUES ('rebuild');"
@@ -0,0 +1,167 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+logger = logging.getLogger("flamel.maintenance")
+
+
+class Maintenance:
+    """
+    Scheduler of the housekeeping statements that keep an engine's database healthy.
+    """
+
+    def __init__(
+        self,
+        engine: Any,
+        interval: Optional[float] = None,
+        analyze_drift: float = 0.25,
+        checkpoint_bytes: int = 4 * 1024 * 1024,
+        truncate_bytes: int = 64 * 1024 * 1024,
+        vacuum_pages: int = 128,
+        optimize_on_close: bool = True,
+    ) -> None:
+        """
+        Initializes a new instance of the Maintenance class and starts its thread when an interval is given.
+
+        Args:
+            engine (SQLiteDBAPI): The engine whose database is maintained.
+            interval (float, optional): The number of seconds between two maintenance runs on a background thread. Defaults to None, which only runs maintenance explicitly and on close.
+            analyze_drift (float, optional): The number of rows modified through the engine since a table's last ANALYZE, relative to its analyzed row count, that triggers a new one. Defaults to 0.25.
+            checkpoint_bytes (int, optional): The WAL size from which a PASSIVE checkpoint is run. Defaults to 4 MiB.
+            truncate_bytes (int, optional): The WAL size from which a TRUNCATE checkpoint is run. Defaults to 64 MiB.
+            vacuum_pages (int, optional): The maximum number of free pages reclaimed by a single incremental vacuum step. Defaults to 128.
+            optimize_on_close (bool, optional): Whether PRAGMA optimize runs when the engine is closed. Defaults to True.
+
+        Raises:
+            ValueError: If interval is not positive.
+        """
+        if interval is not None and interval <= 0:
+            raise ValueError("interval must be greater than 0")
+        self.engine = engine
+        self.interval = interval
+        self.analyze_drift = analyze_drift
+        self.checkpoint_bytes = checkpoint_bytes
+        self.truncate_bytes = truncate_bytes
+        self.vacuum_pages = vacuum_pages
+        self.optimize_on_close = optimize_on_close
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        if interval is not None:
+            self._thread = threading.Thread(
+                target=self._loop, name="flamel-maintenance", daemon=True
+            )
+            self._thread.start()
+
+    def run(self) -> None:
+        self.analyze()
+        self.optimize()
+        self.checkpoint()
+        self.incremental_vacuum()
+
+    def optimize(self) -> None:
+        with self._timed("PRAGMA optimize"):
+            self.engine.execute("PRAGMA optimize")
+
+    def analyze(self) -> List[str]:
+        analyzed = self._analyzed_counts()
+        drifted = [table for table in self._tables() if self._drifted(table, analyzed)]
+        for table in drifted:
+            self.engine.modified_rows.pop(table.lower(), None)
+            with self._timed(f"ANALYZE {table}"):
+                self.engine.execute(f"ANALYZE {table}")
+        return drifted
+
+    def checkpoint(self) -> Optional[str]:
+        size = self.wal_size()
+        if size >= self.truncate_bytes:
+            mode = "TRUNCATE"
+        elif size >= self.checkpoint_bytes:
+            mode = "PASSIVE"
+        else:
+            return None
+        with self._timed(f"PRAGMA wal_checkpoint({mode}) of {size} bytes"):
+            self.engine.execute(f"PRAGMA wal_checkpoint({mode})")
+        return mode
+
+    def incremental_vacuum(self) -> int:
+        if self.engine.execute("PRAGMA auto_vacuum")[0][0] != 2:
+            return 0
+        free = self.engine.execute("PRAGMA freelist_count")[0][0]
+        pages = min(free, self.vacuum_pages)
+        if pages:
+            # sqlite3 steps a statement without result columns only once, which
+            # frees a single page, so every page needs its own statement.
+            with self._timed(f"PRAGMA incremental_vacuum({pages})"):
+                with self.engine.transaction():
+                    for _ in range(pages):
+                        self.engine.execute("PRAGMA incremental_vacuum(1)")
+        return pages
+
+    def wal_size(self) -> int:
+        for _, name, path in self.engine.execute("PRAGMA database_list"):
+            if name == "main" and path:
+                try:
+                    return os.path.getsize(f"{path}-wal")
+                except OSError:
+                    return 0
+        return 0
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._stopped.set()
+            self._thread.join()
+            self._thread = None
+        if self.optimize_on_close:
+            self.optimize()
+
+    def _tables(self) -> List[str]:
+        rows = self.engine.execute(
+            "SELECT name, sql FROM sqlite_master "
+            "WHERE type = 'table' AND name NOT LIKE 'sqlite_%'"
+        )
+        virtual = [
+            name for name, sql in rows if sql.upper().startswith("CREATE VIRTUAL")
+        ]
+        return [
+            name
+            for name, sql in rows
+            if name not in virtual
+            and not any(name.startswith(f"{table}_") for table in virtual)
+        ]
+
+    def _analyzed_counts(self) -> Dict[str, int]:
+        exists = self.engine.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        )
+        if not exists:
+            return {}
+        counts: Dict[str, int] = {}
+        for table, stat in self.engine.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            count = int(str(stat).split()[0])
+            counts[table.lower()] = max(counts.get(table.lower(), 0), count)
+        return counts
+
+    def _drifted(self, table: str, analyzed: Dict[str, int]) -> bool:
+        count = analyzed.get(table.lower())
+        if count is None:
+            return bool(self.engine.execute(f"SELECT 1 FROM {table} LIMIT 1"))
+        modified = self.engine.modified_rows.get(table.lower(), 0)
+        return modified > self.analyze_drift * max(count, 1)
+
+    def _loop(self) -> None:
+        while not self._stopped.wait(self.interval):
+            try:
+                self.run()
+            except Exception:
+                logger.exception("Database maintenance failed")
+
+    @contextmanager
+    def _timed(self, action: str) -> Iterator[None]:
+        started = time.perf_counter()
+        yield
+        logger.info(
+            "%s took %.3f ms", action, (time.perf_counter() - started) * 1000
+        )
@@ -1,26 +1,88 @@
+import asyncio
+import functools
 import re
-from typing import Any, Iterable, List, Optional, Tuple, Union
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from flamel.advisor import IndexAdvisor, PlanStep, parse_plan
+from flamel.cache import QueryCache
+from flamel.column import Column
+from flamel.expression import (
+    BinaryExpression,
+    Expression,
+    Subquery,
+    coerce_clause,
+    column_sql,
+)
+from flamel.fulltext import fulltext_columns, fulltext_table
+from flamel.replica import HotReplica
+from flamel.shard import ShardedEngine
+
+
+_QUALIFIED_COLUMN = re.compile(r"(\w+)\.(\w+)")
+_ALIAS = re.compile(r"\s+AS\s+(\w+)\s*$", re.IGNORECASE)
+
+# Tables read by raw CTE SQL are unknown, so writes could not invalidate them.
+_CTE_NOT_CACHEABLE = "Queries using 'with_cte' cannot be cached."
+
+
+def column_alias(column: str) -> Optional[str]:
+    match = _ALIAS.search(column)
+    return match.group(1) if match else None
+
+
+def _column_list(columns: Any) -> str:
+    if isinstance(columns, (str, Column)):
+        columns = [columns]
+    return ", ".join(
+        column_sql(column) if isinstance(column, Column) else column
+        for column in columns
+    )
 
 
 class SQLQueryBuilder:
     @staticmethod
-    def select(model: Any, columns: Optional[List[str]] = None) -> str:
+    def select(
+        model: Any, columns: Optional[List[str]] = None, source: Optional[str] = None
+    ) -> str:
         if columns is None or not columns:
             columns = ["*"]
 
         column_str = ", ".join(columns)
-        table_name = model.__name__
+        table_name = source or model.__name__
         query = f"SELECT {column_str} FROM {table_name}"
         return query
 
     @staticmethod
-    def filter(**filters: Union[str, Any]) -> Tuple[str, Tuple]:
-        if not filters:
+    def filter(
+        *expressions: Expression, **filters: Union[str, Any]
+    ) -> Tuple[str, Tuple]:
+        if not expressions and not filters:
             return "", ()
 
-        filter_str = " AND ".join([f"{key} = ?" for key in filters])
-        values = tuple(filters.values())
-        return filter_str, values
+        clauses = [f"{key} = ?" for key in filters]
+        values = list(filters.values())
+        wrap = len(expressions) + len(filters) > 1
+        for expression in expressions:
+            sql, params = expression.compile()
+            clauses.append(f"({sql})" if wrap else sql)
+            values.extend(params)
+        filter_str = " AND ".join(clauses)
+        return filter_str, tuple(values)
+
+    @staticmethod
+    def window(
+        func: str,
+        partition_by: Any = None,
+        order_by: Any = None,
+        direction: str = "ASC",
+    ) -> str:
+        clauses = []
+        if partition_by is not None:
+            clauses.append(f"PARTITION BY {_column_list(partition_by)}")
+        if order_by is not None:
+            clauses.append(f"ORDER BY {_column_list(order_by)} {direction}")
+        return f"{func} OVER ({' '.join(clauses)})"
 
     @staticmethod
     def join(join_type: str, table_name: str, on_condition: str) -> str:
@@ -72,64 +134,446 @@ class Query:
         self.query_builder = SQLQueryBuilder()
         self.query = None
         self.values: List[Any] = []
+        self.tables: List[str] = []
+        self._cache_ttl: Optional[float] = None
+        self._cached = False
+        self._has_where = False
+        self._where_clauses: List[str] = []
+        self._where_span: Tuple[int, int] = (0, 0)
+        self.filter_columns: List[Tuple[str, str, bool]] = []
+        self.join_columns: List[Tuple[str, str]] = []
+        self.order_columns: List[Tuple[str, str]] = []
+        self._order_terms: List[str] = []
+        self.select_columns: List[str] = []
+        self.group_columns: List[str] = []
+        self.equalities: Dict[str, Any] = {}
+        self.direction = "ASC"
+        self.limit_clause: Optional[str] = None
+        self.limit_value: Optional[int] = None
+        self.offset_value: Optional[int] = None
+        self.has_having = False
+        self._from_index: Optional[int] = None
+        self._deferred: Optional[set] = None
+        self._has_cte = False
 
     def with_cte(self, cte_name: str, cte_query: str) -> "Query":
+        if self._cached:
+            raise ValueError(_CTE_NOT_CACHEABLE)
         if self.query is None:
             self.query = f"WITH {cte_name} AS ({cte_query}) "
         else:
+            previous = len(self.query)
             self.query = f"WITH {cte_name} AS ({cte_query}), {self.query}"
+            shift = len(self.query) - previous
+            if self._from_index is not None:
+                self._from_index += shift
+            start, end = self._where_span
+            self._where_span = (start + shift, end + shift)
+        self._has_cte = True
+        return self
+
+    def defer(self, *names: str) -> "Query":
+        deferred = self._deferred_columns() | set(names)
+        self._set_deferred(deferred)
+        return self
+
+    def only(self, *names: str) -> "Query":
+        self._set_deferred({key for key, _ in self._model_columns()} - set(names))
         return self
 
     def select(self, *columns: Any) -> "Query":
-        if self.query is None:
-            self.query = self.query_builder.select(self.model, list(columns))
-        else:
-            self.query = (
-                f"{self.query}{self.query_builder.select(self.model, list(columns))}"
+        self._add_table(self.model.__name__)
+        if not columns and self._deferred_columns():
+            columns = tuple(
+                attr.name
+                for key, attr in self._model_columns()
+                if key not in self._deferred_columns()
             )
+        columns = tuple(coerce_clause(column) for column in columns)
+        for column in columns:
+            if isinstance(column, Expression):
+                self.values.extend(column.params())
+                self._add_tables(column)
+        self.select_columns.extend(str(column) for column in columns or ("*",))
+        select = self.query_builder.select(
+            self.model,
+            [str(column) for column in columns],
+            self._source(self.model.__name__),
+        )
+        prefix = self.query or ""
+        self._from_index = len(prefix) + select.rindex(" FROM ")
+        self.query = f"{prefix}{select}"
         return self
 
-    def filter(self, **filters: Any) -> "Query":
+    def window(
+        self,
+        func: str,
+        partition_by: Union[str, Column, Iterable[Union[str, Column]], None] = None,
+        order_by: Union[str, Column, Iterable[Union[str, Column]], None] = None,
+        direction: str = "ASC",
+        alias: Optional[str] = None,
+    ) -> "Query":
+        if self.query is None or self._from_index is None:
+            raise ValueError("The 'select' method must be called before 'window'.")
+        column = self.query_builder.window(func, partition_by, order_by, direction)
+        if alias is not None:
+            column = f"{column} AS {alias}"
+        index = self._from_index
+        self.query = f"{self.query[:index]}, {column}{self.query[index:]}"
+        self._from_index += len(column) + 2
+        self.select_columns.append(column)
+        return self
+
+    def where_in(self, column: Union[str, Column], subquery: "Query") -> "Query":
+        if self.query is None:
+            raise ValueError("The 'select' method must be called before 'where_in'.")
+        if isinstance(column, Column):
+            return self.filter(column.in_(subquery))
+        sub = subquery.subquery()
+        self._add_where(f"{column} IN {sub.to_sql()}")
+        self.values.extend(sub.params())
+        self._add_tables(sub)
+        self.filter_columns.append((*self._split_column(column), True))
+        return self
+
+    def top_n_per_group(
+        self,
+        n: int,
+        partition_by: Union[str, Column, Iterable[Union[str, Column]]],
+        order_by: Union[str, Column, Iterable[Union[str, Column]]],
+        direction: str = "DESC",
+    ) -> "Query":
+        if self.query is None:
+            self.select()
+        names = [
+            column_alias(column) or column.rpartition(".")[2]
+            for column in self.result_columns()
+        ]
+        self.window("ROW_NUMBER()", partition_by, order_by, direction, "_rank")
+        table = self.model.__name__
+        self.query = f"SELECT {', '.join(names)} FROM ({self.query}) AS {table}"
+        self._has_where = False
+        self._add_where("_rank <= ?")
+        self.values.append(n)
+        self.select_columns = names
+        self._from_index = len(f"SELECT {', '.join(names)}")
+        return self
+
+    def subquery(self, alias: Optional[str] = None) -> Subquery:
+        if self.query is None:
+            raise ValueError("The 'select' method must be called before 'subquery'.")
+        return Subquery(self.query, self.values, alias, self.tables)
+
+    def __clause_element__(self) -> Subquery:
+        return self.subquery()
+
+    def filter(self, *expressions: Expression, **filters: Any) -> "Query":
         if self.query is None:
             raise ValueError("The 'select' method must be called before 'filter'.")
-        filter_clause, filter_values = self.query_builder.filter(**filters)
-        if filter_clause:
-            self.query += f" WHERE {filter_clause}"
+        filter_clause, filter_values = self.query_builder.filter(
+            *expressions, **filters
+        )
+        self._add_where(filter_clause)
         self.values.extend(filter_values)
+        for key, value in filters.items():
+            self.filter_columns.append((*self._split_column(key), True))
+            self.equalities[self._split_column(key)[1]] = value
+        for expression in expressions:
+            self._add_tables(expression)
+            for column, equality in expression.columns():
+                table = getattr(column, "table", None) or self.model.__name__
+                self.filter_columns.append((table, column.name, equality))
+            if (
+                isinstance(expression, BinaryExpression)
+                and expression.operator == "="
+                and expression.params()
+            ):
+                self.equalities[expression.column.name] = expression.value
         return self
 
     def join(self, join_type: str, table_name: str, on_condition: str) -> "Query":
         if self.query is None:
             raise ValueError("The 'select' method must be called before 'join'.")
-        self.query += self.query_builder.join(join_type, table_name, on_condition)
+        self.query += self.query_builder.join(
+            join_type, self._source(table_name), on_condition
+        )
+        self._add_table(table_name)
+        for table, column in _QUALIFIED_COLUMN.findall(on_condition):
+            self.join_columns.append((table, column))
         return self
 
     def order_by(self, *columns: Any, direction: str = "ASC") -> "Query":
         if self.query is None:
             raise ValueError("The 'select' method must be called before 'order_by'.")
         self.query += self.query_builder.order_by(*columns, direction=direction)
+        self.order_columns.extend(self._split_column(column) for column in columns)
+        self._order_terms.extend(_column_list(column) for column in columns)
+        self.direction = direction
         return self
 
     def limit(self, limit: int, offset: int = None) -> "Query":
         if self.query is None:
             raise ValueError("The 'select' method must be called before 'limit'.")
-        self.query += self.query_builder.limit(limit, offset)
+        self.limit_clause = self.query_builder.limit(limit, offset)
+        self.limit_value = limit
+        self.offset_value = offset
+        self.query += self.limit_clause
         return self
 
     def group_by(self, *columns: Any) -> "Query":
         if self.query is None:
             raise ValueError("The 'select' method must be called before 'group_by'.")
         self.query += self.query_builder.group_by(*columns)
+        self.group_columns.extend(columns)
         return self
 
     def having(self, condition: str) -> "Query":
         if self.query is not None and "GROUP BY" not in self.query:
             raise ValueError("The 'group_by' method must be called before 'having'.")
         self.query += self.query_builder.having(condition)
+        self.has_having = True
+        return self
+
+    def search(
+        self, text: str, rank: bool = True, limit: Optional[int] = None
+    ) -> "Query":
+        if not fulltext_columns(self.model):
+            raise ValueError(f"{self.model.__name__} has no fulltext columns.")
+        if self.query is None:
+            self.select(f"{self.model.__name__}.*")
+        if self._has_where or " ORDER BY " in self.query or " LIMIT " in self.query:
+            raise ValueError(
+                "The 'search' method must be called before 'filter', 'order_by' "
+                "and 'limit'."
+            )
+        table = self.model.__name__
+        fts = fulltext_table(self.model)
+        self.query += f" JOIN {fts} ON {fts}.rowid = {table}.rowid"
+        self._add_where(f"{fts} MATCH ?")
+        self.values.append(text)
+        if rank:
+            self.query += f" ORDER BY bm25({fts})"
+        if limit is not None:
+            self.limit(limit)
         return self
 
-    def execute(self) -> Any:
-        return self.conn.execute(self.query, self.values)
+    def cached(
+        self, ttl: Optional[float] = None, max_entries: Optional[int] = None
+    ) -> "Query":
+        if self._has_cte:
+            raise ValueError(_CTE_NOT_CACHEABLE)
+        cache = getattr(self.conn, "query_cache", None)
+        if cache is None:
+            cache = QueryCache() if max_entries is None else QueryCache(max_entries)
+            self.conn.query_cache = cache
+        elif max_entries is not None:
+            cache.max_entries = max_entries
+        self._cached = True
+        self._cache_ttl = ttl
+        return self
+
+    def execute(
+        self,
+        timeout: Optional[float] = None,
+        cancel: Optional[threading.Event] = None,
+    ) -> Any:
+        self._prepare()
+
+        options = {}
+        if timeout is not None:
+            options["timeout"] = timeout
+        if cancel is not None:
+            options["cancel"] = cancel
+
+        if not self._cached:
+            return self._run(**options)
+
+        cache = self.conn.query_cache
+        key = (self.query, tuple(self.values))
+        # Versions are read before the query runs, so a write landing before
+        # the result is stored leaves it stale instead of fresh.
+        versions = dict(self.conn.table_versions)
+        hit, result = cache.get(key, versions)
+        if hit:
+            return list(result)
+
+        result = self._run(**options)
+        cache.set(key, self.tables, versions, result, self._cache_ttl)
+        return list(result)
+
+    async def aexecute(self, timeout: Optional[float] = None) -> Any:
+        cancel = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(
+                None, functools.partial(self.execute, timeout=timeout, cancel=cancel)
+            )
+        except asyncio.CancelledError:
+            cancel.set()
+            raise
+
+    def _prepare(self) -> None:
+        replica = getattr(self.conn, "replica", None)
+        if isinstance(replica, HotReplica):
+            replica.maybe_resync()
+        advisor = getattr(self.conn, "advisor", None)
+        if isinstance(advisor, IndexAdvisor):
+            advisor.observe(self)
+
+    def _model_columns(self) -> List[Tuple[str, Column]]:
+        return [
+            (key, attr)
+            for key, attr in vars(self.model).items()
+            if isinstance(attr, Column)
+        ]
+
+    def _deferred_columns(self) -> set:
+        if self._deferred is not None:
+            return self._deferred
+        return {key for key, attr in self._model_columns() if attr.deferred}
+
+    def _set_deferred(self, names: set) -> None:
+        if self.model.__compact__ and names:
+            raise ValueError(
+                f"Compact model {self.model.__name__} cannot defer columns."
+            )
+        if self.query is not None and self._from_index is not None:
+            raise ValueError(
+                "The 'defer' and 'only' methods must be called before 'select'."
+            )
+        columns = dict(self._model_columns())
+        unknown = names - set(columns)
+        if unknown:
+            raise AttributeError(
+                f"{self.model.__name__} has no column {', '.join(sorted(unknown))}."
+            )
+        self._deferred = {key for key in names if not columns[key].primary_key}
+
+    def result_columns(self) -> List[str]:
+        columns = []
+        for column in self.select_columns or ["*"]:
+            if column == "*" or column.endswith(".*"):
+                columns.extend(
+                    attr.name
+                    for attr in vars(self.model).values()
+                    if isinstance(attr, Column)
+                )
+            else:
+                columns.append(column)
+        return columns
+
+    def all(self, timeout: Optional[float] = None) -> List[Any]:
+        names = self.model.attribute_names(self.result_columns())
+        rows = self.execute(timeout=timeout)
+        return [self.model.from_row(row, names) for row in rows]
+
+    def to_json(self, timeout: Optional[float] = None) -> str:
+        rows = self._json_rows("to_json")
+        self._prepare()
+        result = self.conn.execute(
+            f"SELECT json_group_array(json(_object)) FROM ({rows})",
+            self.values,
+            timeout=timeout,
+        )
+        return result[0][0]
+
+    def iter_json(
+        self, chunk_size: int = 1000, timeout: Optional[float] = None
+    ) -> Iterator[str]:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be greater than 0")
+        rows = self._json_rows("iter_json")
+        self._prepare()
+        chunks = self.conn.iterate(rows, self.values, chunk_size, timeout=timeout)
+        yield "["
+        for index, chunk in enumerate(chunks):
+            yield ("," if index else "") + ",".join(row[0] for row in chunk)
+        yield "]"
+
+    def _json_rows(self, method: str) -> str:
+        if self.query is None:
+            raise ValueError(f"The 'select' method must be called before '{method}'.")
+        if isinstance(self.conn, ShardedEngine):
+            raise ValueError(f"'{method}' is not supported on sharded engines.")
+        columns = self.result_columns()
+        names = self.model.attribute_names(columns)
+        aliases = [f"_c{index}" for index in range(len(columns))]
+        # JSON cannot hold BLOB values, so they are encoded as hexadecimal text.
+        pairs = ", ".join(
+            "'{}', CASE typeof({alias}) WHEN 'blob' THEN hex({alias}) "
+            "ELSE {alias} END".format((name or column).replace("'", "''"), alias=alias)
+            for name, column, alias in zip(names, columns, aliases)
+        )
+        query, order = self.query, ""
+        if self._order_terms and self._from_index is not None:
+            # Rows read from a subquery are not guaranteed to keep its order,
+            # so they are numbered in that order and sorted on the number.
+            # Window definitions cannot see result aliases, which are expanded.
+            expressions = {
+                column_alias(column): column[: _ALIAS.search(column).start()]
+                for column in self.select_columns
+                if column_alias(column)
+            }
+            terms = ", ".join(expressions.get(term, term) for term in self._order_terms)
+            number = f"ROW_NUMBER() OVER (ORDER BY {terms} {self.direction})"
+            index = self._from_index
+            query = f"{query[:index]}, {number}{query[index:]}"
+            aliases.append("_n")
+            order = " ORDER BY _n"
+        return (
+            f"WITH _rows({', '.join(aliases)}) AS ({query}) "
+            f"SELECT json_object({pairs}) AS _object FROM _rows{order}"
+        )
+
+    def _run(self, **options: Any) -> Any:
+        if isinstance(self.conn, ShardedEngine):
+            return self.conn.execute_query(self, **options)
+        return self.conn.execute(self.query, self.values, **options)
+
+    def explain(self) -> List[PlanStep]:
+        if self.query is None:
+            raise ValueError("The 'select' method must be called before 'explain'.")
+        if isinstance(self.conn, ShardedEngine):
+            raise ValueError("'explain' is not supported on sharded engines.")
+        rows = self.conn.execute(f"EXPLAIN QUERY PLAN {self.query}", self.values)
+        return parse_plan(rows)
+
+    def _split_column(self, column: str) -> Tuple[str, str]:
+        table, _, name = str(column).rpartition(".")
+        return table or self.model.__name__, name
+
+    def _source(self, table_name: str) -> Optional[str]:
+        replica = getattr(self.conn, "replica", None)
+        if isinstance(replica, HotReplica):
+            return replica.source(table_name)
+        return table_name
+
+    def _add_where(self, clause: str) -> None:
+        if not clause:
+            return
+        if self._has_where:
+            # Every clause is parenthesised once there are several, so a
+            # top-level OR in an earlier filter keeps its precedence.
+            self._where_clauses.append(clause)
+            where = " AND ".join(f"({clause})" for clause in self._where_clauses)
+        else:
+            self.query += " WHERE "
+            self._where_span = (len(self.query), len(self.query))
+            self._where_clauses = [clause]
+            self._has_where = True
+            where = clause
+        start, end = self._where_span
+        self.query = self.query[:start] + where + self.query[end:]
+        self._where_span = (start, start + len(where))
+
+    def _add_tables(self, expression: Expression) -> None:
+        for table_name in expression.tables():
+            self._add_table(table_name)
+
+    def _add_table(self, table_name: str) -> None:
+        table_name = str(table_name).lower()
+        if table_name not in self.tables:
+            self.tables.append(table_name)
 
     def __repr__(self) -> str:
         query_str = f"{self.query}" if getattr(self, "query", None) else ""
@@ -0,0 +1,156 @@
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set
+
+_CREATE_PATTERN = re.compile(
+    r"^CREATE\s+(UNIQUE\s+)?(TABLE|INDEX)\s+(?:IF\s+NOT\s+EXISTS\s+)?", re.IGNORECASE
+)
+
+
+class HotReplica:
+    """
+    In-memory copy of selected tables, attached to the engine connection.
+    """
+
+    schema = "hot"
+
+    def __init__(self, engine: Any, resync_interval: Optional[float] = None) -> None:
+        """
+        Initializes a new instance of the HotReplica class and attaches its in-memory database.
+
+        Args:
+            engine (SQLiteDBAPI): The engine whose connection the replica is attached to.
+            resync_interval (float, optional): The number of seconds after which a pinned table is copied again before the next read. Defaults to None, which only resyncs explicitly or after writes that bypass Base.insert.
+        """
+        self.engine = engine
+        self.resync_interval = resync_interval
+        self.synced_at: Dict[str, float] = {}
+        self.stale: Set[str] = set()
+        self._mirroring: Optional[str] = None
+        engine.execute(f"ATTACH DATABASE ':memory:' AS {self.schema}")
+
+    def reattach(self) -> None:
+        # Called while reconnecting, before the statement that triggered the
+        # reconnect runs, so the tables are copied now rather than marked stale.
+        self.engine.execute(f"ATTACH DATABASE ':memory:' AS {self.schema}")
+        self.resync()
+
+    def pin(self, *models: Any) -> None:
+        for model in models:
+            self._copy(model.__name__)
+
+    def unpin(self, *models: Any) -> None:
+        with self.engine.transaction():
+            for model in models:
+                table = model.__name__
+                self.engine.execute(f"DROP TABLE IF EXISTS {self.schema}.{table}")
+                self.synced_at.pop(table.lower(), None)
+                self.stale.discard(table.lower())
+
+    def is_pinned(self, table: str) -> bool:
+        return table.lower() in self.synced_at
+
+    def source(self, table: str) -> str:
+        if self.is_pinned(table):
+            return f"{self.schema}.{table} AS {table}"
+        return table
+
+    def resync(self, *models: Any) -> None:
+        tables = [model.__name__ for model in models] or list(self.synced_at)
+        for table in tables:
+            self._copy(table)
+
+    def maybe_resync(self) -> None:
+        now = time.monotonic()
+        for table, synced_at in list(self.synced_at.items()):
+            expired = (
+                self.resync_interval is not None
+                and now - synced_at >= self.resync_interval
+            )
+            if table in self.stale or expired:
+                self._copy(table)
+
+    def invalidate(self, table: str) -> None:
+        table = table.lower()
+        if table in self.synced_at and table != self._mirroring:
+            self.stale.add(table)
+
+    @contextmanager
+    def mirroring(self, table: str) -> Iterator[None]:
+        with self.engine.transaction():
+            self._mirroring = table.lower()
+            try:
+                yield
+            finally:
+                self._mirroring = None
+
+    def mirror(self, table: str, where: str, parameters: List[Any] = ()) -> None:
+        self.engine.execute(
+            f"INSERT OR REPLACE INTO {self.schema}.{table} "
+            f"SELECT * FROM main.{table} WHERE {where}",
+            parameters,
+        )
+
+    def mirror_last_insert(self, table: str) -> None:
+        rowid = self.engine.execute("SELECT last_insert_rowid()")[0][0]
+        self.mirror(table, "rowid = ?", [rowid])
+
+    def memory_usage(self) -> Dict[str, int]:
+        tables = {name.lower(): name for name in self._tables()}
+        try:
+            rows = self.engine.execute(
+                f"SELECT m.tbl_name, SUM(s.pgsize) FROM dbstat('{self.schema}') s "
+                f"JOIN {self.schema}.sqlite_master m ON s.name = m.name "
+                "GROUP BY m.tbl_name"
+            )
+        except sqlite3.OperationalError:
+            rows = [(name, self._payload_size(name)) for name in tables.values()]
+        return {
+            tables[name.lower()]: size for name, size in rows if name.lower() in tables
+        }
+
+    def _tables(self) -> List[str]:
+        rows = self.engine.execute(
+            f"SELECT name FROM {self.schema}.sqlite_master WHERE type = 'table'"
+        )
+        return [name for (name,) in rows if self.is_pinned(name)]
+
+    def _payload_size(self, table: str) -> int:
+        columns = self.engine.execute(
+            f"SELECT name FROM pragma_table_info('{table}', '{self.schema}')"
+        )
+        lengths = " + ".join(
+            f"COALESCE(LENGTH(CAST({name} AS BLOB)), 0)" for (name,) in columns
+        )
+        return self.engine.execute(
+            f"SELECT COALESCE(SUM({lengths}), 0) FROM {self.schema}.{table}"
+        )[0][0]
+
+    def _copy(self, table: str) -> None:
+        definitions = self.engine.execute(
+            "SELECT type, sql FROM main.sqlite_master "
+            "WHERE tbl_name = ? COLLATE NOCASE AND type IN ('table', 'index') "
+            "AND sql IS NOT NULL ORDER BY type = 'index'",
+            [table],
+        )
+        if not definitions:
+            raise LookupError(f"Table {table} does not exist.")
+
+        with self.engine.transaction():
+            self.engine.execute(f"DROP TABLE IF EXISTS {self.schema}.{table}")
+            for _, sql in definitions:
+                self.engine.execute(
+                    _CREATE_PATTERN.sub(
+                        lambda m: f"CREATE {m.group(1) or ''}{m.group(2)} "
+                        f"{self.schema}.",
+                        sql,
+                        count=1,
+                    )
+                )
+            self.engine.execute(
+                f"INSERT INTO {self.schema}.{table} SELECT * FROM main.{table}"
+            )
+        self.synced_at[table.lower()] = time.monotonic()
+        self.stale.discard(table.lower())
@@ -0,0 +1,49 @@
+from typing import Any, Optional, Sequence, Tuple
+
+
+class Field:
+    """
+    Read-only descriptor that reads one value of the tuple wrapped by a RowView.
+    """
+
+    __slots__ = ("index",)
+
+    def __init__(self, index: int) -> None:
+        self.index = index
+
+    def __get__(self, instance: Any, owner: type) -> Any:
+        if instance is None:
+            return self
+        return instance._row[self.index]
+
+    def __set__(self, instance: Any, value: Any) -> None:
+        raise AttributeError("Compact model instances are read-only.")
+
+
+class RowView:
+    """
+    Lightweight, slotted view over a result tuple used by compact models.
+    """
+
+    __slots__ = ("_row",)
+    __model__: Any = None
+
+    def __init__(self, row: Tuple) -> None:
+        self._row = row
+
+    def __eq__(self, other: Any) -> bool:
+        return type(self) is type(other) and self._row == other._row
+
+    def __hash__(self) -> int:
+        return hash(self._row)
+
+    def __repr__(self) -> str:
+        return f"{self.__model__.__name__}{self._row!r}"
+
+
+def make_row_class(model: Any, names: Sequence[Optional[str]]) -> type:
+    attrs = {"__slots__": (), "__model__": model}
+    for index, name in enumerate(names):
+        if name is not None:
+            attrs[name] = Field(index)
+    return type(f"{model.__name__}Row", (RowView,), attrs)
@@ -0,0 +1,239 @@
+import heapq
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from flamel.dialect import SQLiteDBAPI
+
+_AGGREGATE = re.compile(r"^\s*(COUNT|SUM|TOTAL|MIN|MAX|AVG)\s*\(", re.IGNORECASE)
+_ALIAS = re.compile(r"\s+AS\s+(\w+)\s*$", re.IGNORECASE)
+
+
+def hash_router(value: Any, shards: int) -> int:
+    return zlib.crc32(str(value).encode("utf-8")) % shards
+
+
+class ShardedEngine:
+    """
+    Engine that spreads rows across several SQLite files by a shard key column.
+
+    Tables without the shard key column are replicated on every shard and read from
+    the first one. Each shard assigns its own autoincrement primary keys, so the same
+    key can exist on several shards.
+    """
+
+    def __init__(
+        self,
+        databases: Sequence[str],
+        shard_key: str,
+        router: Optional[Callable[[Any, int], int]] = None,
+        **options: Any,
+    ) -> None:
+        """
+        Initializes a new instance of the ShardedEngine class and connects to every shard.
+
+        Args:
+            databases (Sequence[str]): The database files, one per shard.
+            shard_key (str): The name of the column used to route rows to shards.
+            router (Callable[[Any, int], int], optional): A function returning the shard index of a shard key value, given the value and the number of shards. Defaults to a CRC32 hash of the value.
+            **options: Keyword arguments passed to the SQLiteDBAPI of every shard, such as busy_timeout or retry_policy.
+
+        Raises:
+            ValueError: If no databases are given.
+        """
+        if not databases:
+            raise ValueError("At least one database is required.")
+        self.shards = [SQLiteDBAPI(database, **options) for database in databases]
+        self.shard_key = shard_key
+        self.router = router or hash_router
+        self.query_cache = None
+        self.replica = None
+        self.advisor = None
+        self.maintenance = None
+        self._sharded_tables: Dict[str, bool] = {}
+        self._executor = self._start_executor()
+
+    @property
+    def table_versions(self) -> Dict[str, int]:
+        versions: Dict[str, int] = {}
+        for shard in self.shards:
+            for table, version in shard.table_versions.items():
+                versions[table] = versions.get(table, 0) + version
+        return versions
+
+    def route(self, value: Any) -> SQLiteDBAPI:
+        index = self.router(value, len(self.shards))
+        if not 0 <= index < len(self.shards):
+            raise IndexError(f"Router returned shard {index} for {value!r}.")
+        return self.shards[index]
+
+    def execute(self, sql: str, parameters: Sequence[Any] = ()) -> List[Tuple]:
+        results = self._map(lambda shard: shard.execute(sql, parameters))
+        return [row for result in results for row in result]
+
+    def executemany(self, sql: str, parameters: Sequence[Any]) -> None:
+        parameters = list(parameters)
+        self._map(lambda shard: shard.executemany(sql, parameters))
+
+    def executescript(self, sql: str) -> None:
+        self._map(lambda shard: shard.executescript(sql))
+
+    def bump_version(self, table: str) -> None:
+        for shard in self.shards:
+            shard.bump_version(table)
+
+    def add_dependency(self, table: str, dependent: str) -> None:
+        for shard in self.shards:
+            shard.add_dependency(table, dependent)
+
+    def commit(self) -> None:
+        for shard in self.shards:
+            shard.commit()
+
+    def interrupt(self) -> None:
+        for shard in self.shards:
+            shard.interrupt()
+
+    def dispose(self) -> None:
+        for shard in self.shards:
+            shard.dispose()
+
+    def close(self) -> None:
+        if self._pid == os.getpid():
+            self._executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+    def is_sharded(self, table: str) -> bool:
+        table = table.lower()
+        if table not in self._sharded_tables:
+            rows = self.shards[0].execute(
+                "SELECT 1 FROM pragma_table_info(?) WHERE name = ? COLLATE NOCASE",
+                [table, self.shard_key],
+            )
+            self._sharded_tables[table] = bool(rows)
+        return self._sharded_tables[table]
+
+    def transaction(self) -> None:
+        raise NotImplementedError(
+            "Transactions are not supported on sharded engines, "
+            "use the transaction of a single shard instead."
+        )
+
+    def savepoint(self, name: str = "flamel_savepoint") -> None:
+        raise NotImplementedError("Savepoints are not supported on sharded engines.")
+
+    def blobopen(self, table, column, row, readonly=True) -> None:
+        raise NotImplementedError(
+            "Incremental blob I/O is not supported on sharded engines."
+        )
+
+    def execute_query(self, query: Any, **options: Any) -> List[Tuple]:
+        if self.shard_key in query.equalities:
+            shard = self.route(query.equalities[self.shard_key])
+            return shard.execute(query.query, query.values, **options)
+        if not any(self.is_sharded(table) for table in query.tables):
+            return self.shards[0].execute(query.query, query.values, **options)
+        return self._fan_out(query, **options)
+
+    def _map(self, function: Callable[[SQLiteDBAPI], Any]) -> List[Any]:
+        if self._pid != os.getpid():
+            # The worker threads of the parent do not exist after fork().
+            self._executor = self._start_executor()
+        return list(self._executor.map(function, self.shards))
+
+    def _start_executor(self) -> ThreadPoolExecutor:
+        self._pid = os.getpid()
+        return ThreadPoolExecutor(
+            max_workers=len(self.shards), thread_name_prefix="flamel-shard"
+        )
+
+    def _fan_out(self, query: Any, **options: Any) -> List[Tuple]:
+        if query.has_having:
+            raise ValueError("HAVING is not supported on queries spanning shards.")
+
+        columns = query.result_columns()
+        aggregates = [_AGGREGATE.match(column) for column in columns]
+        combine = any(aggregates) or bool(query.group_columns)
+
+        sql = query.query
+        if query.limit_clause is not None:
+            head, _, tail = sql.rpartition(query.limit_clause)
+            if combine:
+                sql = head + tail
+            else:
+                fetch = query.limit_value + (query.offset_value or 0)
+                sql = f"{head} LIMIT {fetch}{tail}"
+
+        results = self._map(
+            lambda shard: shard.execute(sql, query.values, **options)
+        )
+
+        order = [_position(columns, column) for _, column in query.order_columns]
+        reverse = query.direction.upper() == "DESC"
+
+        def key(row: Tuple) -> Tuple:
+            return tuple((row[i] is not None, row[i]) for i in order)
+
+        if combine:
+            groups = [_position(columns, column) for column in query.group_columns]
+            rows = _combine(results, groups, aggregates)
+            if order:
+                rows.sort(key=key, reverse=reverse)
+        elif order:
+            rows = list(heapq.merge(*results, key=key, reverse=reverse))
+        else:
+            rows = [row for result in results for row in result]
+
+        if query.limit_value is not None:
+            start = query.offset_value or 0
+            rows = rows[start : start + query.limit_value]
+        return rows
+
+
+def _position(columns: List[str], name: str) -> int:
+    name = str(name).rpartition(".")[2]
+    for index, column in enumerate(columns):
+        alias = _ALIAS.search(column)
+        names = {column, column.rpartition(".")[2]}
+        if alias:
+            names.add(alias.group(1))
+        if name in names:
+            return index
+    raise ValueError(
+        f"Column {name} must be selected to merge results across shards."
+    )
+
+
+def _combine(
+    results: List[List[Tuple]], groups: List[int], aggregates: List[Any]
+) -> List[Tuple]:
+    functions = [match.group(1).upper() if match else None for match in aggregates]
+    if "AVG" in functions:
+        raise ValueError("AVG cannot be combined across shards, use SUM and COUNT.")
+
+    combined: Dict[Tuple, List[Any]] = {}
+    for result in results:
+        for row in result:
+            group = tuple(row[i] for i in groups)
+            current = combined.get(group)
+            if current is None:
+                combined[group] = list(row)
+                continue
+            for i, function in enumerate(functions):
+                current[i] = _merge(function, current[i], row[i])
+    return [tuple(row) for row in combined.values()]
+
+
+def _merge(function: Optional[str], left: Any, right: Any) -> Any:
+    if function is None or right is None:
+        return left
+    if left is None:
+        return right
+    if function in ("COUNT", "SUM", "TOTAL"):
+        return left + right
+    if function == "MIN":
+        return min(left, right)
+    return max(left, right)
@@ -0,0 +1,144 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from flamel.column import Column
+from flamel.query import Query
+
+
+class Summary:
+    """
+    Declarative aggregate table kept up to date by triggers on its source model.
+
+    Subclasses set ``source`` to a model, ``group_by`` to the grouping columns and
+    ``sums`` to the columns to add up. The summary table holds one row per group
+    with a ``sum_<column>`` for every summed column and a ``row_count``. Grouping
+    columns should be declared NOT NULL on the source model, as NULL keys are not
+    merged into a single group.
+    """
+
+    __registry__: Dict[str, Any] = {}
+
+    source: Any = None
+    group_by: Sequence[Any] = ()
+    sums: Sequence[Any] = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        if cls.source is None:
+            raise TypeError(f"{cls.__name__} must define a source model.")
+        if not cls.group_by:
+            raise TypeError(
+                f"{cls.__name__} must define at least one group_by column."
+            )
+        Summary.__registry__[cls.__name__] = cls
+
+    @classmethod
+    def _resolve(cls, column: Any) -> Column:
+        if isinstance(column, Column):
+            return column
+        attr = cls.source.__dict__.get(column)
+        if not isinstance(attr, Column):
+            raise AttributeError(f"{cls.source.__name__} has no column '{column}'.")
+        return attr
+
+    @classmethod
+    def _columns(cls) -> Tuple[List[Column], List[Column]]:
+        return (
+            [cls._resolve(column) for column in cls.group_by],
+            [cls._resolve(column) for column in cls.sums],
+        )
+
+    @classmethod
+    def ddl(cls) -> List[str]:
+        table = cls.__name__
+        source = cls.source.__name__
+        groups, sums = cls._columns()
+        keys = [column.name for column in groups]
+        totals = [f"sum_{column.name}" for column in sums]
+
+        definitions = [f"{c.name} {c.data_type.type_name}" for c in groups]
+        definitions += [
+            f"sum_{c.name} {c.data_type.type_name} NOT NULL DEFAULT 0" for c in sums
+        ]
+        definitions.append("row_count INTEGER NOT NULL DEFAULT 0")
+        definitions.append(f"PRIMARY KEY ({', '.join(keys)})")
+
+        def add(row: str) -> str:
+            columns = ", ".join(keys + totals + ["row_count"])
+            values = ", ".join(
+                [f"{row}.{key}" for key in keys]
+                + [f"COALESCE({row}.{c.name}, 0)" for c in sums]
+                + ["1"]
+            )
+            updates = ", ".join(
+                [f"{total} = {total} + excluded.{total}" for total in totals]
+                + ["row_count = row_count + 1"]
+            )
+            return (
+                f"INSERT INTO {table} ({columns}) VALUES ({values}) "
+                f"ON CONFLICT ({', '.join(keys)}) DO UPDATE SET {updates};"
+            )
+
+        def remove(row: str) -> str:
+            match = " AND ".join(f"{key} IS {row}.{key}" for key in keys)
+            updates = ", ".join(
+                [
+                    f"sum_{c.name} = sum_{c.name} - COALESCE({row}.{c.name}, 0)"
+                    for c in sums
+                ]
+                + ["row_count = row_count - 1"]
+            )
+            return (
+                f"UPDATE {table} SET {updates} WHERE {match}; "
+                f"DELETE FROM {table} WHERE {match} AND row_count <= 0;"
+            )
+
+        return [
+            f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(definitions)});",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON {source} "
+            f"BEGIN {add('NEW')} END;",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON {source} "
+            f"BEGIN {remove('OLD')} END;",
+            f"CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE ON {source} "
+            f"BEGIN {remove('OLD')} {add('NEW')} END;",
+        ]
+
+    @classmethod
+    def create_table(cls) -> None:
+        engine = cls.source.engine
+        with engine.transaction():
+            exists = engine.execute(
+                "SELECT 1 FROM sqlite_master "
+                "WHERE type = 'table' AND name = ? COLLATE NOCASE",
+                [cls.__name__],
+            )
+            for statement in cls.ddl():
+                engine.execute(statement)
+            if not exists:
+                cls.rebuild()
+        engine.add_dependency(cls.source.__name__, cls.__name__)
+
+    @classmethod
+    def rebuild(cls) -> None:
+        table = cls.__name__
+        groups, sums = cls._columns()
+        keys = [column.name for column in groups]
+        columns = ", ".join(keys + [f"sum_{c.name}" for c in sums] + ["row_count"])
+        aggregates = ", ".join(
+            keys + [f"COALESCE(SUM({c.name}), 0)" for c in sums] + ["COUNT(*)"]
+        )
+        engine = cls.source.engine
+        with engine.transaction():
+            engine.execute(f"DELETE FROM {table}")
+            engine.execute(
+                f"INSERT INTO {table} ({columns}) SELECT {aggregates} "
+                f"FROM {cls.source.__name__} GROUP BY {', '.join(keys)}"
+            )
+
+    @classmethod
+    def get(cls, **keys: Any) -> Optional[Tuple]:
+        result = cls.query().select().filter(**keys).limit(1).execute()
+        return result[0] if result else None
+
+    @classmethod
+    def query(cls) -> Query:
+        return Query(cls, cls.source.engine)
@@ -0,0 +1,131 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, List, Optional, Tuple
+
+
+class WriteBehindQueue:
+    """
+    Background writer that groups queued inserts into batched transactions.
+    """
+
+    def __init__(
+        self,
+        base: Any,
+        max_queue: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 0.05,
+    ) -> None:
+        """
+        Initializes a new instance of the WriteBehindQueue class and starts its writer thread.
+
+        Args:
+            base (type): The Base class whose engine and insert method are used for writing.
+            max_queue (int, optional): The maximum number of pending writes before submit blocks. Defaults to 10000.
+            batch_size (int, optional): The maximum number of writes committed in a single transaction. Defaults to 500.
+            flush_interval (float, optional): The number of seconds a batch waits for more writes before committing. Defaults to 0.05.
+
+        Raises:
+            ValueError: If batch_size is lower than 1.
+        """
+        if batch_size < 1:
+            raise ValueError("batch_size must be greater than 0")
+        self.base = base
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Tuple[Any, Future]]" = queue.Queue(max_queue)
+        self._closed = False
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(
+            target=self._run, name="flamel-write-behind", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, instance: Any, timeout: Optional[float] = None) -> Future:
+        future: Future = Future()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError(
+                    "Cannot submit writes to a closed WriteBehindQueue."
+                )
+            self._queue.put((instance, future), timeout=timeout)
+        return future
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._queue.put(None)
+                    self._queue.task_done()
+                    break
+                batch.append(item)
+
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch: List[Tuple[Any, Future]]) -> None:
+        pending = [
+            (instance, future)
+            for instance, future in batch
+            if future.set_running_or_notify_cancel()
+        ]
+        results = []
+        try:
+            with self.base.engine.transaction() as engine:
+                for instance, future in pending:
+                    try:
+                        with engine.savepoint():
+                            self.base.insert(instance)
+                    except Exception as e:
+                        results.append((future, e))
+                    else:
+                        results.append((future, None))
+        except Exception as e:
+            for _, future in pending:
+                future.set_exception(e)
+            return
+
+        for future, error in results:
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(error)
+
+    def __enter__(self) -> "WriteBehindQueue":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
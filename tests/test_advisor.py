@@ -0,0 +1,96 @@
+import unittest
+
+from flamel.advisor import parse_plan
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+
+
+class TestParsePlan(unittest.TestCase):
+    def test_builds_tree(self):
+        roots = parse_plan(
+            [
+                (2, 0, 0, "SCAN Worker"),
+                (4, 2, 0, "USE TEMP B-TREE FOR ORDER BY"),
+                (7, 0, 0, "SEARCH Company USING INTEGER PRIMARY KEY (rowid=?)"),
+            ]
+        )
+        self.assertEqual([root.detail for root in roots][0], "SCAN Worker")
+        self.assertEqual(len(roots), 2)
+        self.assertTrue(roots[0].is_full_scan)
+        self.assertEqual(roots[0].table, "Worker")
+        self.assertTrue(roots[0].children[0].uses_temp_btree)
+        self.assertFalse(roots[1].is_full_scan)
+
+    def test_covering_index_scan_is_not_a_full_scan(self):
+        (root,) = parse_plan([(2, 0, 0, "SCAN Worker USING COVERING INDEX idx")])
+        self.assertFalse(root.is_full_scan)
+
+    def test_legacy_scan_table_format(self):
+        (root,) = parse_plan([(2, 0, 0, "SCAN TABLE Worker AS w")])
+        self.assertTrue(root.is_full_scan)
+        self.assertEqual(root.table, "Worker")
+
+    def test_constant_row_and_subquery_are_not_full_scans(self):
+        for detail in ("SCAN CONSTANT ROW", "SCAN SUBQUERY 1"):
+            (root,) = parse_plan([(2, 0, 0, detail)])
+            self.assertFalse(root.is_full_scan)
+            self.assertIsNone(root.table)
+
+
+class TestIndexAdvisor(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Employee(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False)
+            team = Column("team", String)
+            age = Column("age", Integer)
+
+        self.model = Employee
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        self.advisor = Base.enable_index_advisor()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_explain(self):
+        plan = self.model.query().select().filter(team="core").explain()
+        self.assertEqual(plan[0].detail, "SCAN Employee")
+
+    def test_records_distinct_shapes(self):
+        for team in ("core", "web", "core"):
+            self.model.query().select().filter(team=team).execute()
+        self.assertEqual(len(self.advisor.shapes), 1)
+        (shape,) = self.advisor.shapes.values()
+        self.assertEqual(shape.count, 3)
+        self.assertTrue(shape.flagged)
+
+    def test_suggests_indexes(self):
+        self.model.query().select().filter(
+            self.model.age > 30, team="core"
+        ).order_by("name").execute()
+        self.assertEqual(
+            self.advisor.suggestions(),
+            [
+                "CREATE INDEX IF NOT EXISTS idx_Employee_team_age_name "
+                "ON Employee (team, age, name);"
+            ],
+        )
+
+    def test_suggested_index_removes_full_scan(self):
+        self.model.query().select().filter(team="core").execute()
+        (suggestion,) = self.advisor.suggestions()
+        Base.engine.execute(suggestion)
+        plan = self.model.query().select().filter(team="core").explain()
+        self.assertFalse(any(step.is_full_scan for step in plan))
+
+    def test_assert_no_full_scans(self):
+        self.advisor.register(self.model.query().select().filter(id=1))
+        self.advisor.assert_no_full_scans()
+
+        self.advisor.register(self.model.query().select().filter(team="core"))
+        with self.assertRaises(AssertionError):
+            self.advisor.assert_no_full_scans()
@@ -0,0 +1,111 @@
+import io
+import sqlite3
+import unittest
+
+from flamel.base import Base
+from flamel.blob import BlobIO
+from flamel.column import Blob, Column, Integer, String
+
+requires_blobopen = unittest.skipUnless(
+    hasattr(sqlite3.Connection, "blobopen"),
+    "Incremental blob I/O requires Python 3.11 or newer.",
+)
+
+
+class TestBlobIO(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Attachment(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False)
+            payload = Column("payload", Blob)
+
+        self.model = Attachment
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.execute(
+            "INSERT INTO Attachment (id, name, payload) VALUES (?, ?, ?)",
+            [1, "report.pdf", b"0123456789"],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    @requires_blobopen
+    def test_open_blob_returns_stream(self):
+        with self.model.open_blob(1, "payload") as stream:
+            self.assertIsInstance(stream, BlobIO)
+            self.assertEqual(len(stream), 10)
+            self.assertEqual(stream.read(), b"0123456789")
+
+    @requires_blobopen
+    def test_readinto_buffer(self):
+        buffer = bytearray(4)
+        with self.model.open_blob(1, "payload") as stream:
+            stream.seek(3)
+            self.assertEqual(stream.readinto(buffer), 4)
+            self.assertEqual(buffer, b"3456")
+            self.assertEqual(stream.readinto(memoryview(buffer)[:2]), 2)
+            self.assertEqual(buffer, b"7856")
+            self.assertEqual(stream.tell(), 9)
+
+    @requires_blobopen
+    def test_seek_from_end(self):
+        with self.model.open_blob(1, "payload") as stream:
+            stream.seek(-2, io.SEEK_END)
+            self.assertEqual(stream.read(), b"89")
+
+    @requires_blobopen
+    def test_read_mode_rejects_writes(self):
+        with self.model.open_blob(1, "payload") as stream:
+            with self.assertRaises(io.UnsupportedOperation):
+                stream.write(b"x")
+
+    @requires_blobopen
+    def test_writable_stream_invalidates_cached_results(self):
+        query = self.model.query().select("payload").cached()
+        self.assertEqual(query.execute(), [(b"0123456789",)])
+        with self.model.open_blob(1, "payload", mode="r") as stream:
+            stream.read()
+        with self.model.open_blob(1, "payload", mode="w") as stream:
+            version = Base.engine.table_versions.get("attachment", 0)
+            stream.write(b"abc")
+        self.assertEqual(Base.engine.table_versions["attachment"], version + 1)
+
+        query = self.model.query().select("payload").cached()
+        self.assertEqual(query.execute(), [(b"abc3456789",)])
+
+    @requires_blobopen
+    def test_write_blob_in_chunks(self):
+        data = io.BytesIO(b"a" * 1000 + b"b" * 24)
+        self.model.write_blob(1, "payload", data, size=1024, chunk_size=100)
+        result = Base.engine.execute("SELECT payload FROM Attachment WHERE id = 1")
+        self.assertEqual(result[0][0], b"a" * 1000 + b"b" * 24)
+
+    @requires_blobopen
+    def test_write_blob_from_iterable(self):
+        self.model.write_blob(1, "payload", [b"ab", b"cd"], size=4)
+        with self.model.open_blob(1, "payload") as stream:
+            self.assertEqual(stream.read(), b"abcd")
+
+    @requires_blobopen
+    def test_write_blob_size_mismatch(self):
+        with self.assertRaises(ValueError):
+            self.model.write_blob(1, "payload", [b"abc"], size=2)
+        with self.assertRaises(ValueError):
+            self.model.write_blob(1, "payload", [b"a"], size=4)
+
+        result = Base.engine.execute("SELECT payload FROM Attachment WHERE id = 1")
+        self.assertEqual(result[0][0], b"0123456789")
+
+    def test_open_blob_invalid_column(self):
+        with self.assertRaises(TypeError):
+            self.model.open_blob(1, "name")
+        with self.assertRaises(AttributeError):
+            self.model.open_blob(1, "missing")
+
+    def test_open_blob_missing_row(self):
+        with self.assertRaises(LookupError):
+            self.model.open_blob(2, "payload")
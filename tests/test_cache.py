@@ -0,0 +1,132 @@
+import unittest
+from unittest.mock import patch
+
+from flamel.base import Base
+from flamel.cache import QueryCache
+from flamel.column import Column, Integer, String
+from flamel.dialect import written_tables
+from flamel.query import Query
+
+
+class TestQueryCache(unittest.TestCase):
+    def test_get_missing_key(self):
+        cache = QueryCache()
+        self.assertEqual(cache.get("key", {}), (False, None))
+
+    def test_set_and_get(self):
+        cache = QueryCache()
+        cache.set("key", ["worker"], {"worker": 1}, [(1,)])
+        self.assertEqual(cache.get("key", {"worker": 1}), (True, [(1,)]))
+
+    def test_version_change_invalidates(self):
+        cache = QueryCache()
+        cache.set("key", ["worker"], {"worker": 1}, [(1,)])
+        self.assertEqual(cache.get("key", {"worker": 2}), (False, None))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate_table(self):
+        cache = QueryCache()
+        cache.set("a", ["worker"], {}, [])
+        cache.set("b", ["company"], {}, [])
+        cache.invalidate("worker")
+        self.assertEqual(len(cache), 1)
+        self.assertTrue(cache.get("b", {})[0])
+
+    def test_lru_eviction(self):
+        cache = QueryCache(max_entries=2)
+        cache.set("a", ["t"], {}, 1)
+        cache.set("b", ["t"], {}, 2)
+        cache.get("a", {})
+        cache.set("c", ["t"], {}, 3)
+        self.assertTrue(cache.get("a", {})[0])
+        self.assertFalse(cache.get("b", {})[0])
+        self.assertTrue(cache.get("c", {})[0])
+
+    def test_ttl_expiry(self):
+        cache = QueryCache()
+        with patch("flamel.cache.time.monotonic", return_value=100.0):
+            cache.set("key", ["t"], {}, 1, ttl=5)
+        with patch("flamel.cache.time.monotonic", return_value=104.0):
+            self.assertTrue(cache.get("key", {})[0])
+        with patch("flamel.cache.time.monotonic", return_value=105.0):
+            self.assertFalse(cache.get("key", {})[0])
+
+    def test_invalid_max_entries(self):
+        with self.assertRaises(ValueError):
+            QueryCache(max_entries=0)
+
+
+class TestCachedQuery(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Setting(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False, unique=True)
+
+        self.model = Setting
+        Base.set_engine(":memory:")
+        Base.create_tables()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_cached_query_hits(self):
+        Base.insert(self.model(name="theme"))
+        query = self.model.query().select("name").cached(ttl=60)
+        self.assertEqual(query.execute(), [("theme",)])
+        self.assertEqual(query.execute(), [("theme",)])
+        self.assertEqual(Base.engine.query_cache.hits, 1)
+
+    def test_insert_invalidates_cached_results(self):
+        Base.insert(self.model(name="theme"))
+        self.model.query().select("name").cached().execute()
+
+        Base.insert(self.model(name="locale"))
+        result = self.model.query().select("name").cached().execute()
+        self.assertEqual(sorted(result), [("locale",), ("theme",)])
+
+    def test_executemany_invalidates_cached_results(self):
+        self.model.query().select("name").cached().execute()
+        Base.engine.executemany(
+            "INSERT INTO Setting (name) VALUES (?)", [("a",), ("b",)]
+        )
+        result = self.model.query().select("name").cached().execute()
+        self.assertEqual(len(result), 2)
+
+    def test_executescript_bumps_version(self):
+        Base.engine.executescript("INSERT INTO Setting (name) VALUES ('a');")
+        self.assertEqual(Base.engine.table_versions["setting"], 1)
+
+    def test_executescript_on_one_line_invalidates(self):
+        Base.insert(self.model(name="theme"))
+        query = self.model.query().select("name").cached()
+        self.assertEqual(query.execute(), [("theme",)])
+
+        Base.engine.executescript("BEGIN; DELETE FROM Setting; COMMIT;")
+        self.assertEqual(self.model.query().select("name").cached().execute(), [])
+
+    def test_written_tables_after_other_statements(self):
+        self.assertEqual(
+            written_tables("INSERT INTO a VALUES (1); UPDATE b SET x = 1"), ["a", "b"]
+        )
+        self.assertEqual(
+            written_tables("WITH t AS (SELECT 1) INSERT INTO c SELECT * FROM t"),
+            ["c"],
+        )
+
+    def test_write_during_query_leaves_result_stale(self):
+        Base.insert(self.model(name="theme"))
+        run = Query._run
+
+        def run_then_write(query, **options):
+            result = run(query, **options)
+            Base.insert(self.model(name="locale"))
+            return result
+
+        with patch.object(Query, "_run", run_then_write):
+            self.model.query().select("name").cached().execute()
+
+        result = self.model.query().select("name").cached().execute()
+        self.assertEqual(sorted(result), [("locale",), ("theme",)])
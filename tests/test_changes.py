@@ -0,0 +1,94 @@
+import unittest
+
+from flamel.base import Base
+from flamel.changes import Change, changelog_ddl
+from flamel.column import Column, Integer, String
+
+
+class TestChanges(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Item(Base, changelog=True):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False)
+
+        class Note(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            text = Column("text", String)
+
+        self.item = Item
+        self.note = Note
+        Base.set_engine(":memory:")
+        Base.create_tables()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_ddl_only_for_opted_in_models(self):
+        self.assertEqual(changelog_ddl(self.note), [])
+        self.assertEqual(len(changelog_ddl(self.item)), 5)
+
+    def test_records_inserts_updates_and_deletes(self):
+        Base.insert(self.item(name="a"))
+        Base.insert(self.item(name="b"))
+        Base.engine.execute("UPDATE Item SET name = 'c' WHERE id = 1")
+        Base.engine.execute("DELETE FROM Item WHERE id = 2")
+
+        self.assertEqual(
+            list(self.item.changes()),
+            [
+                Change(1, "insert", 1),
+                Change(2, "insert", 2),
+                Change(3, "update", 1),
+                Change(4, "delete", 2),
+            ],
+        )
+        self.assertEqual(self.item.change_seq(), 4)
+
+    def test_primary_key_update_records_delete_of_old_key(self):
+        Base.insert(self.item(name="a"))
+        Base.engine.execute("UPDATE Item SET id = 10 WHERE id = 1")
+
+        changes = sorted((c.operation, c.key) for c in self.item.changes(since=1))
+        self.assertEqual(changes, [("delete", 1), ("update", 10)])
+
+    def test_changes_since_in_batches(self):
+        Base.engine.executemany(
+            "INSERT INTO Item (name) VALUES (?)", [(str(i),) for i in range(7)]
+        )
+
+        changes = list(self.item.changes(since=2, batch=2))
+        self.assertEqual([change.seq for change in changes], [3, 4, 5, 6, 7])
+
+    def test_acknowledge_truncates_and_keeps_sequence(self):
+        Base.engine.executemany(
+            "INSERT INTO Item (name) VALUES (?)", [(str(i),) for i in range(3)]
+        )
+        self.item.acknowledge_changes(3)
+
+        self.assertEqual(list(self.item.changes()), [])
+        Base.engine.execute("INSERT INTO Item (name) VALUES ('x')")
+        self.assertEqual(list(self.item.changes()), [Change(4, "insert", 4)])
+
+    def test_compact_keeps_latest_change_per_key(self):
+        Base.insert(self.item(name="a"))
+        Base.engine.execute("UPDATE Item SET name = 'b' WHERE id = 1")
+        Base.engine.execute("UPDATE Item SET name = 'c' WHERE id = 1")
+        Base.engine.execute("DELETE FROM Item WHERE id = 1")
+        Base.engine.execute("INSERT INTO Item (name) VALUES ('d')")
+        self.item.compact_changes()
+
+        self.assertEqual(
+            list(self.item.changes()),
+            [Change(4, "delete", 1), Change(5, "insert", 2)],
+        )
+
+    def test_writes_bump_changelog_version(self):
+        Base.engine.execute("INSERT INTO Item (name) VALUES ('a')")
+        self.assertEqual(Base.engine.table_versions["item_changes"], 1)
+
+    def test_model_without_changelog(self):
+        with self.assertRaises(ValueError):
+            list(self.note.changes())
@@ -27,7 +27,7 @@ class TestColumn(unittest.TestCase):
         col = Column("name", String, nullable=False, default="", unique=True)
         self.assertEqual(
             repr(col),
-            "Column(name, String, name=name, nullable=False, default=, primary_key=False, unique=True, check=None, autoincrement=False, foreign_key=None)",
+            "Column(name, String, name=name, nullable=False, default=, primary_key=False, unique=True, check=None, autoincrement=False, foreign_key=None, fulltext=False, deferred=False)",
         )
 
     def test_default_value(self):
@@ -88,6 +88,16 @@ class TestColumn(unittest.TestCase):
         with self.assertRaises(TypeError):
             Column("name", list)
 
+    def test_fulltext_requires_string(self):
+        self.assertTrue(Column("bio", String, fulltext=True).fulltext)
+        with self.assertRaises(TypeError):
+            Column("age", Integer, fulltext=True)
+
+    def test_deferred_primary_key(self):
+        self.assertTrue(Column("bio", String, deferred=True).deferred)
+        with self.assertRaises(ValueError):
+            Column("id", Integer, primary_key=True, deferred=True)
+
     def test_create_column_with_invalid_check_function(self):
         with self.assertRaises(TypeError):
             Column("age", Integer, check=lambda x: 1)
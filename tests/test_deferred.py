@@ -0,0 +1,111 @@
+import unittest
+from unittest.mock import patch
+
+from flamel.base import Base
+from flamel.column import Blob, Column, Integer, String
+
+
+class TestDeferredColumns(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Document(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            title = Column("title", String, nullable=False)
+            body = Column("body", String, deferred=True)
+            raw = Column("raw", Blob, deferred=True)
+
+        self.model = Document
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Document (title, body, raw) VALUES (?, ?, ?)",
+            [(f"doc {i}", f"body {i}", b"x" * i) for i in range(1, 6)],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_select_skips_deferred_columns(self):
+        self.assertEqual(
+            str(self.model.query().select()), "SELECT id, title FROM Document"
+        )
+
+    def test_defer_and_only(self):
+        self.assertEqual(
+            str(self.model.query().only("title").select()),
+            "SELECT id, title FROM Document",
+        )
+        self.assertEqual(
+            str(self.model.query().only("title", "body").select()),
+            "SELECT id, title, body FROM Document",
+        )
+        self.assertEqual(
+            str(self.model.query().defer("title").select()),
+            "SELECT id FROM Document",
+        )
+
+    def test_defer_after_select(self):
+        with self.assertRaises(ValueError):
+            self.model.query().select().defer("body")
+
+    def test_defer_unknown_column(self):
+        with self.assertRaises(AttributeError):
+            self.model.query().defer("missing")
+
+    def test_lazy_load_on_first_access(self):
+        document = self.model.query().select().filter(id=2).all()[0]
+        self.assertNotIn("body", document.__dict__)
+        with patch.object(Base.engine, "execute", wraps=Base.engine.execute) as spy:
+            self.assertEqual(document.body, "body 2")
+            self.assertEqual(document.body, "body 2")
+        self.assertEqual(spy.call_count, 1)
+        self.assertEqual(document.raw, b"xx")
+
+    def test_batched_undefer(self):
+        documents = self.model.query().select().all()
+        with patch.object(Base.engine, "execute", wraps=Base.engine.execute) as spy:
+            self.model.undefer(documents, "body", batch=2)
+        self.assertEqual(spy.call_count, 3)
+        self.assertEqual(
+            [d.__dict__["body"] for d in documents[:2]], ["body 1", "body 2"]
+        )
+        self.assertNotIn("raw", documents[0].__dict__)
+
+        self.model.undefer(documents)
+        self.assertNotIn("__deferred__", documents[0].__dict__)
+        self.assertEqual(documents[4].raw, b"xxxxx")
+
+    def test_undefer_deleted_row(self):
+        document = self.model.query().select().filter(id=1).all()[0]
+        Base.engine.execute("DELETE FROM Document WHERE id = 1")
+        with self.assertRaises(LookupError):
+            document.body
+
+    def test_new_instances_are_not_lazy(self):
+        document = self.model(title="new")
+        self.assertIsNone(document.body)
+
+    def test_compact_models_cannot_defer(self):
+        with self.assertRaises(TypeError):
+
+            class Note(Base, compact=True):
+                id = Column("id", Integer, primary_key=True, autoincrement=True)
+                body = Column("body", String, deferred=True)
+
+        class Line(Base, compact=True):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            text = Column("text", String)
+
+        Base.create_tables()
+        Base.engine.execute("INSERT INTO Line (text) VALUES ('a')")
+        with self.assertRaises(ValueError):
+            Line.query().defer("text")
+        with self.assertRaises(ValueError):
+            Line.query().only("id")
+
+        lines = Line.query().select().all()
+        Line.undefer(lines)
+        self.assertEqual(lines[0].text, "a")
+        self.assertNotIn("Note", Base.__registry__)
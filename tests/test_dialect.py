@@ -1,7 +1,16 @@
+import os
 import sqlite3
+import tempfile
+import threading
+import time
 import unittest
 
-from flamel.dialect import SQLiteDBAPI
+from flamel.dialect import (
+    QueryInterrupted,
+    QueryTimeout,
+    RetryPolicy,
+    SQLiteDBAPI,
+)
 
 
 class TestConnection(unittest.TestCase):
@@ -19,3 +28,152 @@ class TestConnection(unittest.TestCase):
         with SQLiteDBAPI(database) as db:
             with self.assertRaises(sqlite3.OperationalError):
                 db.execute(invalid_sql)
+
+
+class TestWriteContention(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "contention.db")
+        self.db = SQLiteDBAPI(
+            self.path,
+            busy_timeout=0,
+            retry_policy=RetryPolicy(max_attempts=50, base_delay=0.01, max_delay=0.05),
+        )
+        self.db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY, name TEXT)")
+        self.other = sqlite3.connect(
+            self.path, timeout=0, isolation_level=None, check_same_thread=False
+        )
+
+    def tearDown(self):
+        self.other.close()
+        self.db.close()
+        self.tmpdir.cleanup()
+
+    def test_retry_policy_delay_is_bounded(self):
+        policy = RetryPolicy(base_delay=0.1, max_delay=0.3)
+        for attempt in range(10):
+            delay = policy.delay(attempt)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(delay, min(0.3, 0.1 * 2**attempt))
+
+    def test_retry_policy_requires_an_attempt(self):
+        with self.assertRaises(ValueError):
+            RetryPolicy(max_attempts=0)
+
+    def test_transaction_begins_immediate(self):
+        with self.db.transaction():
+            with self.assertRaises(sqlite3.OperationalError):
+                self.other.execute("BEGIN IMMEDIATE")
+
+    def test_write_retries_until_lock_is_released(self):
+        self.other.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer(0.1, self.other.commit)
+        timer.start()
+        try:
+            self.db.execute("INSERT INTO item (name) VALUES (?)", ["a"])
+        finally:
+            timer.join()
+
+        self.assertEqual(self.db.execute("SELECT name FROM item"), [("a",)])
+        self.assertGreater(self.db.contention.retries, 0)
+        self.assertGreater(self.db.contention.wait_time, 0)
+        self.assertEqual(self.db.contention.give_ups, 0)
+
+    def test_transaction_retries_begin(self):
+        self.other.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer(0.1, self.other.commit)
+        timer.start()
+        try:
+            with self.db.transaction():
+                self.db.execute("INSERT INTO item (name) VALUES (?)", ["a"])
+        finally:
+            timer.join()
+
+        self.assertEqual(self.db.execute("SELECT COUNT(*) FROM item"), [(1,)])
+        self.assertGreater(self.db.contention.retries, 0)
+
+    def test_gives_up_after_max_attempts(self):
+        self.db.retry_policy = RetryPolicy(max_attempts=2, base_delay=0.001)
+        self.other.execute("BEGIN IMMEDIATE")
+
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.execute("INSERT INTO item (name) VALUES (?)", ["a"])
+
+        self.other.rollback()
+        self.assertEqual(self.db.contention.retries, 1)
+        self.assertEqual(self.db.contention.give_ups, 1)
+        self.db.contention.reset()
+        self.assertEqual(self.db.contention.retries, 0)
+
+    def test_non_retryable_errors_are_raised_at_once(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.execute("INSERT INTO missing (name) VALUES (?)", ["a"])
+
+        self.assertEqual(self.db.contention.retries, 0)
+        self.assertEqual(self.db.contention.give_ups, 0)
+
+
+RUNAWAY = (
+    "WITH RECURSIVE n(value) AS (SELECT 1 UNION ALL SELECT value + 1 FROM n) "
+    "SELECT COUNT(*) FROM n WHERE value < 0"
+)
+
+
+class TestStatementDeadlines(unittest.TestCase):
+    def setUp(self):
+        self.db = SQLiteDBAPI(":memory:")
+
+    def tearDown(self):
+        self.db.close()
+
+    def test_timeout_interrupts_statement(self):
+        started = time.monotonic()
+        with self.assertRaises(QueryTimeout):
+            self.db.execute(RUNAWAY, timeout=0.05)
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(self.db.execute("SELECT 1"), [(1,)])
+
+    def test_engine_default_timeout(self):
+        self.db.statement_timeout = 0.05
+        with self.assertRaises(QueryTimeout):
+            self.db.execute(RUNAWAY)
+
+    def test_timeout_is_an_operational_error(self):
+        with self.assertRaises(sqlite3.OperationalError):
+            self.db.execute(RUNAWAY, timeout=0.01)
+
+    def test_fast_statement_within_deadline(self):
+        self.assertEqual(self.db.execute("SELECT 1", timeout=1), [(1,)])
+
+    def test_interrupt_from_another_thread(self):
+        done = threading.Event()
+
+        def interrupt():
+            # An interrupt issued before the statement starts is a no-op.
+            while not done.wait(0.05):
+                self.db.interrupt()
+
+        thread = threading.Thread(target=interrupt)
+        thread.start()
+        try:
+            with self.assertRaises(QueryInterrupted) as context:
+                self.db.execute(RUNAWAY, timeout=5)
+        finally:
+            done.set()
+            thread.join()
+
+        self.assertNotIsInstance(context.exception, QueryTimeout)
+
+    def test_cancel_event(self):
+        cancel = threading.Event()
+        timer = threading.Timer(0.05, cancel.set)
+        timer.start()
+        try:
+            with self.assertRaises(QueryInterrupted):
+                self.db.execute(RUNAWAY, cancel=cancel)
+        finally:
+            timer.join()
+
+        with self.assertRaises(QueryInterrupted):
+            self.db.execute("SELECT 1", cancel=cancel)
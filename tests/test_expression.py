@@ -0,0 +1,134 @@
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+from flamel.expression import _compiled, and_, not_, or_
+
+
+class Worker(Base):
+    id = Column("id", Integer, primary_key=True, autoincrement=True)
+    name = Column("name", String, nullable=False)
+    age = Column("age", Integer)
+
+
+class TestColumnExpressions(unittest.TestCase):
+    def test_comparison_operators(self):
+        self.assertEqual((Worker.age >= 30).compile(), ("Worker.age >= ?", [30]))
+        self.assertEqual((Worker.age < 30).compile(), ("Worker.age < ?", [30]))
+        self.assertEqual((Worker.name != "x").compile(), ("Worker.name != ?", ["x"]))
+
+    def test_null_comparisons(self):
+        self.assertEqual(
+            (Worker.age == None).compile(), ("Worker.age IS NULL", [])  # noqa: E711
+        )
+        self.assertEqual(
+            Worker.age.is_not(None).compile(), ("Worker.age IS NOT NULL", [])
+        )
+
+    def test_like_in_between(self):
+        self.assertEqual(
+            Worker.name.like("J%").compile(), ("Worker.name LIKE ?", ["J%"])
+        )
+        self.assertEqual(
+            Worker.age.in_([1, 2, 3]).compile(),
+            ("Worker.age IN (?, ?, ?)", [1, 2, 3]),
+        )
+        self.assertEqual(
+            Worker.age.between(20, 30).compile(),
+            ("Worker.age BETWEEN ? AND ?", [20, 30]),
+        )
+
+    def test_boolean_combinations(self):
+        expression = or_(
+            Worker.age < 20, and_(Worker.age > 60, Worker.name.like("J%"))
+        )
+        self.assertEqual(
+            expression.compile(),
+            (
+                "(Worker.age < ?) OR ((Worker.age > ?) AND (Worker.name LIKE ?))",
+                [20, 60, "J%"],
+            ),
+        )
+        self.assertEqual((~(Worker.age == 1)).compile(), ("NOT (Worker.age = ?)", [1]))
+        self.assertEqual(not_(Worker.age == 1).compile()[0], "NOT (Worker.age = ?)")
+
+    def test_column_to_column_comparison(self):
+        self.assertEqual(
+            (Worker.id == Worker.age).compile(), ("Worker.id = Worker.age", [])
+        )
+
+    def test_compiled_once_per_shape(self):
+        (Worker.age > 1).compile()
+        size = len(_compiled)
+        sql, params = (Worker.age > 99).compile()
+        self.assertEqual(len(_compiled), size)
+        self.assertEqual(params, [99])
+
+    def test_expression_is_not_a_boolean(self):
+        with self.assertRaises(TypeError):
+            bool(Worker.age > 1)
+
+    def test_column_is_still_hashable(self):
+        self.assertIn(Worker.age, {Worker.age})
+
+
+class TestQueryFilterExpressions(unittest.TestCase):
+    def setUp(self):
+        Base.set_engine(":memory:")
+        Base.engine.execute(
+            "CREATE TABLE Worker (id INTEGER PRIMARY KEY, name TEXT, age INTEGER)"
+        )
+        Base.engine.executemany(
+            "INSERT INTO Worker (name, age) VALUES (?, ?)",
+            [("John", 35), ("Jane", 28), ("Mike", None), ("Joe", 61)],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+
+    def test_filter_with_expressions(self):
+        query = Worker.query().select("name").filter(Worker.age >= 30, name="John")
+        self.assertEqual(
+            str(query),
+            "SELECT name FROM Worker WHERE name = ? AND (Worker.age >= ?), ['John', 30]",
+        )
+        self.assertEqual(query.execute(), [("John",)])
+
+    def test_filter_with_or(self):
+        result = (
+            Worker.query()
+            .select("name")
+            .filter(or_(Worker.age.is_(None), Worker.age > 60))
+            .order_by("name")
+            .execute()
+        )
+        self.assertEqual(result, [("Joe",), ("Mike",)])
+
+    def test_chained_filters(self):
+        query = (
+            Worker.query()
+            .select("name")
+            .filter(Worker.name.like("J%"))
+            .filter(or_(Worker.age < 30, Worker.age > 60))
+        )
+        self.assertEqual(
+            str(query),
+            "SELECT name FROM Worker WHERE (Worker.name LIKE ?) AND "
+            "((Worker.age < ?) OR (Worker.age > ?)), ['J%', 30, 60]",
+        )
+        self.assertEqual(sorted(query.execute()), [("Jane",), ("Joe",)])
+
+    def test_chained_filter_after_or_keeps_precedence(self):
+        query = (
+            Worker.query()
+            .select("name")
+            .filter(or_(Worker.age < 30, Worker.age > 55))
+            .filter(Worker.name == "John")
+            .filter(name="John")
+        )
+        self.assertEqual(
+            str(query),
+            "SELECT name FROM Worker WHERE ((Worker.age < ?) OR (Worker.age > ?)) "
+            "AND (Worker.name = ?) AND (name = ?), [30, 55, 'John', 'John']",
+        )
+        self.assertEqual(query.execute(), [])
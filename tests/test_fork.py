@@ -0,0 +1,152 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer
+from flamel.dialect import SQLiteDBAPI
+
+ROWS = 50
+
+
+class Entry(Base):
+    id = Column("id", Integer, primary_key=True, autoincrement=True)
+    worker = Column("worker", Integer, nullable=False)
+    position = Column("position", Integer, nullable=False)
+
+
+def _work(worker):
+    for position in range(ROWS):
+        Base.engine.execute(
+            "INSERT INTO Entry (worker, position) VALUES (?, ?)", [worker, position]
+        )
+    count = Base.engine.execute(
+        "SELECT COUNT(*) FROM Entry WHERE worker = ?", [worker]
+    )[0][0]
+    journal_mode = Base.engine.execute("PRAGMA journal_mode")[0][0]
+    return os.getpid(), Base.engine._pid, count, journal_mode
+
+
+@unittest.skipUnless(
+    "fork" in multiprocessing.get_all_start_methods(), "fork is not available"
+)
+class TestForkedWorkers(unittest.TestCase):
+    def setUp(self):
+        self.registry = dict(Base.__registry__)
+        Base.__registry__.clear()
+        Base.__registry__["Entry"] = Entry
+        self.tmpdir = tempfile.TemporaryDirectory()
+        Base.set_engine(os.path.join(self.tmpdir.name, "fork.db"))
+        Base.engine.execute("PRAGMA journal_mode = WAL")
+        Base.create_tables()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+        Base.__registry__.update(self.registry)
+        self.tmpdir.cleanup()
+
+    def test_workers_write_and_read_through_inherited_engine(self):
+        context = multiprocessing.get_context("fork")
+        with context.Pool(4) as pool:
+            results = pool.map(_work, range(8))
+
+        for pid, owner, count, journal_mode in results:
+            self.assertNotEqual(pid, os.getpid())
+            self.assertEqual(owner, pid)
+            self.assertEqual(count, ROWS)
+            self.assertEqual(journal_mode, "wal")
+
+        self.assertEqual(Base.engine._pid, os.getpid())
+        self.assertEqual(
+            Base.engine.execute("SELECT COUNT(DISTINCT worker), COUNT(*) FROM Entry"),
+            [(8, 8 * ROWS)],
+        )
+
+    def test_engine_dispose_before_forking(self):
+        Base.engine_dispose()
+        context = multiprocessing.get_context("fork")
+        with context.Pool(2) as pool:
+            results = pool.map(_work, range(2))
+
+        self.assertEqual([count for _, _, count, _ in results], [ROWS, ROWS])
+        self.assertEqual(
+            Base.engine.execute("SELECT COUNT(*) FROM Entry"), [(2 * ROWS,)]
+        )
+
+
+class TestReconnect(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "reconnect.db")
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_reopens_with_same_pragmas_after_pid_change(self):
+        db = SQLiteDBAPI(self.path, pragmas={"foreign_keys": 1})
+        db.execute("PRAGMA cache_size = -4000")
+        db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+        inherited = db.conn
+
+        db._pid = -1
+        self.assertIsNot(db.conn, inherited)
+        self.assertEqual(db.execute("PRAGMA foreign_keys"), [(1,)])
+        self.assertEqual(db.execute("PRAGMA cache_size"), [(-4000,)])
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM item"), [(0,)])
+        inherited.close()
+        db.close()
+
+    def test_dispose_reconnects_lazily(self):
+        db = SQLiteDBAPI(self.path)
+        db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+        db.dispose()
+
+        self.assertIsNone(db._conn)
+        db.execute("INSERT INTO item DEFAULT VALUES")
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM item"), [(1,)])
+        db.close()
+
+    def test_dispose_keeps_in_memory_database(self):
+        db = SQLiteDBAPI(":memory:")
+        db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+        db.dispose()
+
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM item"), [(0,)])
+        db.close()
+
+    def test_dispose_reattaches_replica_and_clears_cache(self):
+        Base.__registry__.clear()
+
+        class Kind(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            rank = Column("rank", Integer)
+
+        Base.set_engine(self.path)
+        try:
+            Base.create_tables()
+            Base.insert(Kind(rank=1))
+            Base.pin_in_memory(Kind)
+            query = Kind.query().select("rank").cached()
+            self.assertEqual(query.execute(), [(1,)])
+            Base.engine_dispose()
+
+            other = SQLiteDBAPI(self.path)
+            other.execute("UPDATE Kind SET rank = 2")
+            other.close()
+            self.assertEqual(Kind.query().select("rank").execute(), [(2,)])
+            self.assertEqual(Kind.query().select("rank").cached().execute(), [(2,)])
+        finally:
+            Base.engine_close()
+            Base.__registry__.clear()
+
+    def test_in_memory_database_keeps_inherited_connection(self):
+        db = SQLiteDBAPI(":memory:")
+        db.execute("CREATE TABLE item (id INTEGER PRIMARY KEY)")
+        inherited = db.conn
+
+        db._pid = -1
+        self.assertIs(db.conn, inherited)
+        self.assertEqual(db.execute("SELECT COUNT(*) FROM item"), [(0,)])
+        db.close()
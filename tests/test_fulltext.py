@@ -0,0 +1,99 @@
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+from flamel.fulltext import fulltext_ddl
+
+
+class TestFullText(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Article(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            title = Column("title", String, nullable=False, fulltext=True)
+            body = Column("body", String, fulltext=True)
+            author = Column("author", String)
+
+        self.model = Article
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Article (title, body, author) VALUES (?, ?, ?)",
+            [
+                ("SQLite internals", "sqlite btree pages and the sqlite pager", "ana"),
+                ("Python tips", "generators and sqlite cursors", "bob"),
+                ("Cooking", "pasta recipes", "carl"),
+            ],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_ddl(self):
+        ddl = fulltext_ddl(self.model)
+        self.assertEqual(
+            ddl[0],
+            "CREATE VIRTUAL TABLE IF NOT EXISTS Article_fts USING fts5(title, body, "
+            "content='Article', content_rowid='rowid');",
+        )
+        self.assertEqual(len(ddl), 4)
+
+    def test_search_ranked(self):
+        query = self.model.query().search("sqlite")
+        self.assertEqual(
+            str(query),
+            "SELECT Article.* FROM Article JOIN Article_fts "
+            "ON Article_fts.rowid = Article.rowid WHERE Article_fts MATCH ? "
+            "ORDER BY bm25(Article_fts), ['sqlite']",
+        )
+        titles = [row[1] for row in query.execute()]
+        self.assertEqual(titles, ["SQLite internals", "Python tips"])
+
+    def test_search_with_limit_and_columns(self):
+        query = self.model.query().select("Article.title")
+        result = query.search("sqlite", limit=1).execute()
+        self.assertEqual(result, [("SQLite internals",)])
+
+    def test_triggers_follow_updates_and_deletes(self):
+        Base.engine.execute(
+            "UPDATE Article SET body = 'risotto' WHERE author = 'carl'"
+        )
+        Base.engine.execute("DELETE FROM Article WHERE author = 'bob'")
+        self.assertEqual(self.model.query().search("pasta").execute(), [])
+        self.assertEqual(len(self.model.query().search("risotto").execute()), 1)
+        self.assertEqual(len(self.model.query().search("sqlite").execute()), 1)
+
+    def test_rebuild_fulltext(self):
+        Base.engine.execute(
+            "INSERT INTO Article_fts (Article_fts) VALUES ('delete-all')"
+        )
+        self.assertEqual(self.model.query().search("pasta").execute(), [])
+        self.model.rebuild_fulltext()
+        self.assertEqual(len(self.model.query().search("pasta").execute()), 1)
+
+    def test_create_tables_indexes_existing_rows(self):
+        for name in ("Article_fts_ai", "Article_fts_ad", "Article_fts_au"):
+            Base.engine.execute(f"DROP TRIGGER {name}")
+        Base.engine.execute("DROP TABLE Article_fts")
+
+        Base.create_tables()
+        self.assertEqual(len(self.model.query().search("pasta").execute()), 1)
+        Base.engine.execute("UPDATE Article SET body = 'risotto' WHERE id = 3")
+        self.assertEqual(self.model.query().search("pasta").execute(), [])
+        self.assertEqual(len(self.model.query().search("risotto").execute()), 1)
+
+        Base.create_tables()
+        self.assertEqual(len(self.model.query().search("risotto").execute()), 1)
+
+    def test_search_after_filter(self):
+        with self.assertRaises(ValueError):
+            self.model.query().select().filter(author="ana").search("sqlite")
+
+    def test_search_without_fulltext_columns(self):
+        class Plain(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+
+        with self.assertRaises(ValueError):
+            Plain.query().search("x")
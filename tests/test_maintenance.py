@@ -0,0 +1,121 @@
+import os
+import tempfile
+import time
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+from flamel.maintenance import Maintenance
+
+
+class TestMaintenance(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Item(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String)
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, "maintenance.db")
+        Base.set_engine(self.path)
+        Base.engine.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        Base.engine.execute("PRAGMA journal_mode = WAL")
+        Base.create_tables()
+        self.insert(100)
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+        self.tmpdir.cleanup()
+
+    def insert(self, count):
+        Base.engine.executemany(
+            "INSERT INTO Item (name) VALUES (?)", [("x" * 500,)] * count
+        )
+
+    def test_analyze_when_row_counts_drift(self):
+        maintenance = Maintenance(Base.engine, analyze_drift=0.5)
+
+        self.assertEqual(maintenance.analyze(), ["Item"])
+        self.assertEqual(maintenance.analyze(), [])
+        self.insert(20)
+        self.assertEqual(maintenance.analyze(), [])
+        self.insert(40)
+        self.assertEqual(maintenance.analyze(), ["Item"])
+
+    def test_analyze_skips_virtual_and_shadow_tables(self):
+        class Note(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            body = Column("body", String, fulltext=True)
+
+        Base.create_tables()
+        Base.engine.execute("INSERT INTO Note (body) VALUES ('sqlite')")
+        maintenance = Maintenance(Base.engine)
+
+        self.assertEqual(sorted(maintenance.analyze()), ["Item", "Note"])
+        self.assertEqual(maintenance.analyze(), [])
+
+    def test_analyze_when_rows_are_deleted(self):
+        maintenance = Maintenance(Base.engine, analyze_drift=0.5)
+        self.assertEqual(maintenance.analyze(), ["Item"])
+
+        Base.engine.execute("DELETE FROM Item WHERE id BETWEEN 2 AND 99")
+        self.assertEqual(Base.engine.modified_rows["item"], 98)
+        self.assertEqual(maintenance.analyze(), ["Item"])
+        self.assertEqual(maintenance.analyze(), [])
+
+    def test_checkpoint_by_wal_size(self):
+        maintenance = Maintenance(
+            Base.engine, checkpoint_bytes=1, truncate_bytes=1 << 30
+        )
+        self.assertGreater(maintenance.wal_size(), 0)
+        self.assertEqual(maintenance.checkpoint(), "PASSIVE")
+
+        maintenance.truncate_bytes = 1
+        self.assertEqual(maintenance.checkpoint(), "TRUNCATE")
+        self.assertEqual(maintenance.wal_size(), 0)
+        self.assertIsNone(maintenance.checkpoint())
+
+    def test_incremental_vacuum_in_steps(self):
+        Base.engine.execute("DELETE FROM Item")
+        Base.engine.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        maintenance = Maintenance(Base.engine, vacuum_pages=3)
+        free = Base.engine.execute("PRAGMA freelist_count")[0][0]
+        self.assertGreater(free, 3)
+
+        self.assertEqual(maintenance.incremental_vacuum(), 3)
+        self.assertEqual(Base.engine.execute("PRAGMA freelist_count")[0][0], free - 3)
+
+    def test_actions_are_logged_with_duration(self):
+        maintenance = Maintenance(Base.engine, checkpoint_bytes=1)
+        with self.assertLogs("flamel.maintenance", "INFO") as logs:
+            maintenance.run()
+
+        messages = "\n".join(logs.output)
+        self.assertIn("ANALYZE Item took", messages)
+        self.assertIn("PRAGMA optimize took", messages)
+        self.assertIn("PRAGMA wal_checkpoint(PASSIVE)", messages)
+        self.assertRegex(messages, r"took \d+\.\d{3} ms")
+
+    def test_interval_runs_in_background_and_optimizes_on_close(self):
+        maintenance = Base.enable_maintenance(interval=0.01)
+        self.assertIs(Base.enable_maintenance(), maintenance)
+        deadline = time.monotonic() + 2
+        while time.monotonic() < deadline:
+            if Base.engine.execute(
+                "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+            ):
+                break
+            time.sleep(0.01)
+        else:
+            self.fail("maintenance did not run")
+
+        with self.assertLogs("flamel.maintenance", "INFO") as logs:
+            maintenance.close()
+        self.assertIn("PRAGMA optimize", logs.output[-1])
+        self.assertIsNone(maintenance._thread)
+
+    def test_interval_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            Maintenance(Base.engine, interval=0)
@@ -1,8 +1,14 @@
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase
 from unittest.mock import MagicMock, patch
 
 from flamel.base import Base
 from flamel.column import Column, Integer, String, ForeignKey
+from flamel.dialect import QueryTimeout
 from flamel.query import Query, SQLQueryBuilder, validate_sql
 
 
@@ -275,3 +281,330 @@ class TestQueryHaving(TestCase):
         )
         expected_query = "SELECT column1, column2 FROM table_example GROUP BY column1 HAVING SUM(column2) > 100 AND AVG(column2) < 50"
         self.assertEqual(str(self.query), expected_query)
+
+
+class TestQueryWindowAndSubqueries(TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Customer(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False)
+
+        class Purchase(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            customer_id = Column("customer_id", Integer, nullable=False)
+            total = Column("total", Integer, nullable=False)
+
+        self.customer = Customer
+        self.purchase = Purchase
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Customer (name) VALUES (?)", [("ana",), ("bob",), ("eve",)]
+        )
+        Base.engine.executemany(
+            "INSERT INTO Purchase (customer_id, total) VALUES (?, ?)",
+            [(1, 10), (1, 30), (1, 20), (2, 5), (2, 50)],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_window(self):
+        query = (
+            self.purchase.query()
+            .select("customer_id", "total")
+            .window(
+                "SUM(total)",
+                partition_by="customer_id",
+                order_by=self.purchase.total,
+                alias="running",
+            )
+            .filter(customer_id=1)
+        )
+        self.assertEqual(
+            str(query),
+            "SELECT customer_id, total, SUM(total) OVER (PARTITION BY customer_id "
+            "ORDER BY Purchase.total ASC) AS running FROM Purchase "
+            "WHERE customer_id = ?, [1]",
+        )
+        self.assertEqual(
+            sorted(query.execute()), [(1, 10, 10), (1, 20, 30), (1, 30, 60)]
+        )
+
+    def test_window_without_select(self):
+        with self.assertRaises(ValueError):
+            self.purchase.query().window("ROW_NUMBER()")
+
+    def test_where_in_subquery(self):
+        big_spenders = (
+            self.purchase.query().select("customer_id").filter(self.purchase.total > 40)
+        )
+        query = self.customer.query().select("name").where_in("id", big_spenders)
+        self.assertEqual(
+            str(query),
+            "SELECT name FROM Customer WHERE id IN "
+            "(SELECT customer_id FROM Purchase WHERE Purchase.total > ?), [40]",
+        )
+        self.assertEqual(query.execute(), [("bob",)])
+
+    def test_column_in_subquery(self):
+        buyers = self.purchase.query().select("customer_id")
+        result = (
+            self.customer.query()
+            .select("name")
+            .filter(self.customer.id.not_in(buyers))
+            .execute()
+        )
+        self.assertEqual(result, [("eve",)])
+
+    def test_scalar_subquery(self):
+        spent = (
+            self.purchase.query()
+            .select("SUM(total)")
+            .filter(self.purchase.customer_id == self.customer.id)
+        )
+        query = (
+            self.customer.query()
+            .select("name", spent.subquery("spent"))
+            .filter(self.customer.id == 1)
+        )
+        self.assertEqual(query.execute(), [("ana", 60)])
+
+    def test_subquery_tables_invalidate_cached_results(self):
+        big_spenders = (
+            self.purchase.query().select("customer_id").filter(self.purchase.total > 90)
+        )
+        where_in = (
+            self.customer.query().select("name").where_in("id", big_spenders).cached()
+        )
+        in_filter = (
+            self.customer.query()
+            .select("name")
+            .filter(self.customer.id.in_(big_spenders))
+            .cached()
+        )
+        spent = (
+            self.purchase.query()
+            .select("SUM(total)")
+            .filter(self.purchase.customer_id == self.customer.id)
+        )
+        scalar = (
+            self.customer.query()
+            .select("name", spent.subquery("spent"))
+            .filter(self.customer.id == 3)
+            .cached()
+        )
+        self.assertEqual(where_in.tables, ["customer", "purchase"])
+        self.assertEqual(where_in.execute(), [])
+        self.assertEqual(in_filter.execute(), [])
+        self.assertEqual(scalar.execute(), [("eve", None)])
+
+        Base.engine.execute(
+            "INSERT INTO Purchase (customer_id, total) VALUES (?, ?)", [3, 100]
+        )
+        self.assertEqual(where_in.execute(), [("eve",)])
+        self.assertEqual(in_filter.execute(), [("eve",)])
+        self.assertEqual(scalar.execute(), [("eve", 100)])
+
+    def test_cte_queries_cannot_be_cached(self):
+        query = self.customer.query().with_cte("c", "SELECT 1").select("name")
+        with self.assertRaises(ValueError):
+            query.cached()
+        with self.assertRaises(ValueError):
+            self.customer.query().cached().with_cte("c", "SELECT 1")
+
+    def test_compare_with_scalar_subquery(self):
+        average = self.purchase.query().select("AVG(total)")
+        result = (
+            self.purchase.query()
+            .select("total")
+            .filter(self.purchase.total > average)
+            .execute()
+        )
+        self.assertEqual(result, [(30,), (50,)])
+
+    def test_top_n_per_group(self):
+        query = (
+            self.purchase.query()
+            .select()
+            .filter(self.purchase.total > 5)
+            .top_n_per_group(1, "customer_id", "total")
+        )
+        self.assertEqual(
+            str(query),
+            "SELECT id, customer_id, total FROM (SELECT *, ROW_NUMBER() OVER "
+            "(PARTITION BY customer_id ORDER BY total DESC) AS _rank FROM Purchase "
+            "WHERE Purchase.total > ?) AS Purchase WHERE _rank <= ?, [5, 1]",
+        )
+        self.assertEqual(sorted(query.execute()), [(2, 1, 30), (5, 2, 50)])
+        rows = query.all()
+        self.assertEqual(sorted(row.total for row in rows), [30, 50])
+
+    def test_top_n_per_group_can_be_filtered(self):
+        query = (
+            self.purchase.query()
+            .top_n_per_group(2, self.purchase.customer_id, self.purchase.total)
+            .filter(self.purchase.customer_id == 1)
+            .order_by("total")
+        )
+        self.assertEqual(query.execute(), [(3, 1, 20), (2, 1, 30)])
+
+
+class TestQueryDeadlines(TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Number(Base):
+            value = Column("value", Integer, primary_key=True)
+
+        self.number = Number
+        Base.set_engine(":memory:")
+        Base.engine.execute(
+            "CREATE VIEW Number AS WITH RECURSIVE n(value) AS "
+            "(SELECT 1 UNION ALL SELECT value + 1 FROM n) SELECT value FROM n"
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_execute_timeout(self):
+        query = self.number.query().select("value").filter(value=0)
+        with self.assertRaises(QueryTimeout):
+            query.execute(timeout=0.05)
+
+    def test_aexecute_cancelled_with_task(self):
+        query = self.number.query().select("value").filter(value=0)
+
+        async def run():
+            with self.assertRaises(asyncio.TimeoutError):
+                await asyncio.wait_for(query.aexecute(), 0.05)
+
+        started = time.monotonic()
+        asyncio.run(run())
+        self.assertEqual(Base.engine.execute("SELECT 1"), [(1,)])
+        self.assertLess(time.monotonic() - started, 1)
+
+    def test_aexecute_result(self):
+        query = self.number.query().select("value").limit(3)
+        self.assertEqual(asyncio.run(query.aexecute()), [(1,), (2,), (3,)])
+
+
+class TestQueryJson(TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Employee(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            full_name = Column("name", String, nullable=False)
+            team = Column("team", String)
+
+        self.employee = Employee
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Employee (name, team) VALUES (?, ?)",
+            [("ana", "core"), ("bob", None), ('eve "e"', "ops")],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_to_json_uses_attribute_names(self):
+        result = self.employee.query().select().order_by("id").to_json()
+        self.assertEqual(
+            json.loads(result),
+            [
+                {"id": 1, "full_name": "ana", "team": "core"},
+                {"id": 2, "full_name": "bob", "team": None},
+                {"id": 3, "full_name": 'eve "e"', "team": "ops"},
+            ],
+        )
+
+    def test_to_json_with_filters_aliases_and_aggregates(self):
+        query = (
+            self.employee.query()
+            .select("name", "id AS number", "LENGTH(name)")
+            .filter(team="core")
+        )
+        self.assertEqual(
+            json.loads(query.to_json()),
+            [{"full_name": "ana", "number": 1, "LENGTH(name)": 3}],
+        )
+
+    def test_to_json_empty_result(self):
+        query = self.employee.query().select().filter(team="none")
+        self.assertEqual(query.to_json(), "[]")
+
+    def test_iter_json_streams_chunks(self):
+        query = self.employee.query().select("id").order_by("id")
+        chunks = list(query.iter_json(chunk_size=2))
+
+        self.assertEqual(len(chunks), 4)
+        self.assertEqual("".join(chunks), query.to_json())
+        self.assertEqual(json.loads("".join(chunks)), [{"id": i} for i in (1, 2, 3)])
+
+    def test_json_keeps_order_by_alias(self):
+        query = (
+            self.employee.query()
+            .select("id AS number")
+            .order_by("number", direction="DESC")
+        )
+        expected = [{"number": i} for i in (3, 2, 1)]
+        self.assertEqual(json.loads(query.to_json()), expected)
+        self.assertEqual(json.loads("".join(query.iter_json(chunk_size=1))), expected)
+
+    def test_json_keeps_order_of_top_n_per_group(self):
+        query = (
+            self.employee.query()
+            .select("id", "team")
+            .top_n_per_group(1, "team", "id")
+            .order_by("id", direction="DESC")
+        )
+        self.assertEqual(
+            [row["id"] for row in json.loads(query.to_json())], [3, 2, 1]
+        )
+
+    def test_json_encodes_blobs_as_hex(self):
+        query = (
+            self.employee.query()
+            .select("id", "CAST(name AS BLOB) AS raw")
+            .filter(team="core")
+        )
+        self.assertEqual(json.loads(query.to_json()), [{"id": 1, "raw": "616E61"}])
+        self.assertEqual("".join(query.iter_json()), query.to_json())
+
+    def test_iter_json_yields_before_reading_later_rows(self):
+        query = self.employee.query().select(
+            "CASE WHEN id = 3 THEN json('not json') ELSE id END AS value"
+        )
+        chunks = query.iter_json(chunk_size=1)
+
+        # sqlite3 steps one row ahead of the rows it returns.
+        self.assertEqual([next(chunks), next(chunks)], ["[", '{"value":1}'])
+        with self.assertRaises(sqlite3.OperationalError):
+            next(chunks)
+
+    def test_iter_json_releases_engine_between_chunks(self):
+        chunks = self.employee.query().select("id").order_by("id").iter_json(1)
+        self.assertEqual([next(chunks), next(chunks)], ["[", '{"id":1}'])
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            count = executor.submit(
+                Base.engine.execute, "SELECT COUNT(*) FROM Employee", timeout=1
+            )
+            self.assertEqual(count.result(timeout=5), [(3,)])
+            rest = executor.submit(lambda: "".join(chunks))
+            self.assertEqual(rest.result(timeout=5), ',{"id":2},{"id":3}]')
+
+    def test_iter_json_empty_result(self):
+        query = self.employee.query().select().filter(team="none")
+        self.assertEqual("".join(query.iter_json()), "[]")
+
+    def test_to_json_before_select(self):
+        with self.assertRaises(ValueError):
+            self.employee.query().to_json()
@@ -0,0 +1,92 @@
+import unittest
+from unittest.mock import patch
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+
+
+class TestHotReplica(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Country(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            code = Column("code", String, nullable=False, unique=True)
+
+        class Purchase(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            country_id = Column("country_id", Integer)
+
+        self.country = Country
+        self.order = Purchase
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Country (code) VALUES (?)", [("ES",), ("FR",)]
+        )
+        self.replica = Base.pin_in_memory(Country)
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def hot_rows(self):
+        return Base.engine.execute("SELECT id, code FROM hot.Country ORDER BY id")
+
+    def test_pin_copies_table(self):
+        self.assertTrue(self.replica.is_pinned("Country"))
+        self.assertEqual(self.hot_rows(), [(1, "ES"), (2, "FR")])
+
+    def test_reads_are_served_from_memory(self):
+        query = self.country.query().select("code").filter(self.country.id == 1)
+        self.assertEqual(
+            str(query),
+            "SELECT code FROM hot.Country AS Country WHERE Country.id = ?, [1]",
+        )
+        self.assertEqual(query.execute(), [("ES",)])
+
+    def test_join_with_pinned_table(self):
+        Base.engine.execute("INSERT INTO Purchase (country_id) VALUES (2)")
+        query = (
+            self.order.query()
+            .select("Country.code")
+            .join("INNER", "Country", "Purchase.country_id = Country.id")
+        )
+        self.assertIn("INNER JOIN hot.Country AS Country", str(query))
+
+    def test_insert_is_applied_to_both_copies(self):
+        Base.insert(self.country(code="IT"))
+        self.assertEqual(self.hot_rows()[-1], (3, "IT"))
+        self.assertNotIn("country", self.replica.stale)
+
+    def test_raw_write_triggers_resync_before_read(self):
+        Base.engine.execute("DELETE FROM Country WHERE code = 'FR'")
+        self.assertIn("country", self.replica.stale)
+        result = self.country.query().select("code").execute()
+        self.assertEqual(result, [("ES",)])
+        self.assertEqual(self.replica.stale, set())
+
+    def test_periodic_resync(self):
+        self.replica.resync_interval = 10
+        with patch("flamel.replica.time.monotonic", return_value=0):
+            self.replica.resync()
+        Base.engine.execute("INSERT INTO main.Country (code) VALUES ('PT')")
+        self.replica.stale.clear()
+        with patch("flamel.replica.time.monotonic", return_value=5):
+            self.replica.maybe_resync()
+        self.assertEqual(len(self.hot_rows()), 2)
+        with patch("flamel.replica.time.monotonic", return_value=10):
+            self.replica.maybe_resync()
+        self.assertEqual(len(self.hot_rows()), 3)
+
+    def test_memory_usage(self):
+        usage = self.replica.memory_usage()
+        self.assertEqual(list(usage), ["Country"])
+        self.assertGreater(usage["Country"], 0)
+
+    def test_unpin(self):
+        self.replica.unpin(self.country)
+        self.assertFalse(self.replica.is_pinned("Country"))
+        self.assertEqual(
+            str(self.country.query().select("code")), "SELECT code FROM Country"
+        )
@@ -0,0 +1,94 @@
+import tracemalloc
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+from flamel.row import RowView
+
+# Documented target: a compact instance costs at most 72 bytes on top of the
+# result tuple it wraps, including its slot in the result list.
+COMPACT_BYTES_PER_INSTANCE = 72
+
+
+def allocated_per_item(factory, rows):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        items = [factory(row) for row in rows]
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    assert len(items) == len(rows)
+    return (after - before) / len(rows)
+
+
+class TestCompactModels(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Reading(Base, compact=True):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            sensor = Column("sensor", String, nullable=False)
+            value = Column("value", Integer)
+
+        class Sample(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            sensor = Column("sensor", String, nullable=False)
+            value = Column("value", Integer)
+
+        self.compact = Reading
+        self.regular = Sample
+        Base.set_engine(":memory:")
+        Base.create_tables()
+        Base.engine.executemany(
+            "INSERT INTO Reading (sensor, value) VALUES (?, ?)",
+            [(f"s{i % 10}", i) for i in range(100)],
+        )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def test_all_returns_compact_rows(self):
+        rows = self.compact.query().select().order_by("id").all()
+        self.assertIsInstance(rows[0], RowView)
+        self.assertIsInstance(rows[0], self.compact.from_row((1, "a", 2)).__class__)
+        self.assertEqual((rows[0].id, rows[0].sensor, rows[0].value), (1, "s0", 0))
+        self.assertFalse(hasattr(rows[0], "__dict__"))
+
+    def test_partial_select(self):
+        (row,) = self.compact.query().select("value").filter(id=5).all()
+        self.assertEqual(row.value, 4)
+        with self.assertRaises(AttributeError):
+            row.sensor
+
+    def test_compact_rows_are_read_only(self):
+        row = self.compact.from_row((1, "a", 2))
+        with self.assertRaises(AttributeError):
+            row.value = 3
+
+    def test_compact_row_can_be_inserted(self):
+        row = self.compact.from_row((None, "copy", 7))
+        Base.insert(row)
+        result = Base.engine.execute(
+            "SELECT value FROM Reading WHERE sensor = 'copy'"
+        )
+        self.assertEqual(result, [(7,)])
+
+    def test_regular_models_hydrate_instances(self):
+        Base.engine.execute("INSERT INTO Sample (sensor, value) VALUES ('a', 2)")
+        (row,) = self.regular.query().select().all()
+        self.assertIsInstance(row, self.regular)
+        self.assertEqual(row.sensor, "a")
+
+    def test_aliased_columns(self):
+        (row,) = self.compact.query().select("COUNT(*) AS total").all()
+        self.assertEqual(row.total, 100)
+
+    def test_bytes_per_instance(self):
+        rows = [(i, "sensor", i) for i in range(10000)]
+        self.compact.from_row(rows[0])
+        compact = allocated_per_item(self.compact.from_row, rows)
+        regular = allocated_per_item(self.regular.from_row, rows)
+        self.assertLessEqual(compact, COMPACT_BYTES_PER_INSTANCE)
+        self.assertLess(compact, regular / 2)
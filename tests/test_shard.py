@@ -0,0 +1,198 @@
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, Real, String
+from flamel.shard import ShardedEngine, hash_router
+from flamel.summary import Summary
+
+
+def tenant_router(value, shards):
+    return value % shards
+
+
+class TestShardedEngine(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Invoice(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            number = Column("number", String, nullable=False)
+            tenant_id = Column("tenant_id", Integer, nullable=False)
+            amount = Column("amount", Real)
+
+        class Country(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            code = Column("code", String, nullable=False)
+
+        self.model = Invoice
+        self.country = Country
+        Base.set_sharded_engine([":memory:"] * 3, "tenant_id", tenant_router)
+        Base.create_tables()
+        for tenant in range(6):
+            for n in range(2):
+                Base.insert(
+                    Invoice(
+                        tenant_id=tenant,
+                        number=f"{tenant}-{n}",
+                        amount=float(tenant * 10 + n),
+                    )
+                )
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def shard_counts(self):
+        return [
+            shard.execute("SELECT COUNT(*) FROM Invoice")[0][0]
+            for shard in Base.engine.shards
+        ]
+
+    def test_create_tables_runs_on_every_shard(self):
+        for shard in Base.engine.shards:
+            tables = shard.execute("SELECT name FROM sqlite_master WHERE type='table'")
+            self.assertIn(("Invoice",), tables)
+
+    def test_insert_routes_by_shard_key(self):
+        self.assertEqual(self.shard_counts(), [4, 4, 4])
+        rows = Base.engine.shards[1].execute("SELECT DISTINCT tenant_id FROM Invoice")
+        self.assertEqual(sorted(rows), [(1,), (4,)])
+
+    def test_keyed_query_hits_single_shard(self):
+        query = self.model.query().select("number").filter(tenant_id=4)
+        self.assertEqual(sorted(query.execute()), [("4-0",), ("4-1",)])
+        query = self.model.query().select("number").filter(self.model.tenant_id == 2)
+        self.assertEqual(len(query.execute()), 2)
+
+    def test_fan_out_order_by_and_limit(self):
+        result = (
+            self.model.query()
+            .select("number", "amount")
+            .order_by("amount", direction="DESC")
+            .limit(3, offset=1)
+            .execute()
+        )
+        self.assertEqual(result, [("5-0", 50.0), ("4-1", 41.0), ("4-0", 40.0)])
+
+    def test_fan_out_select_all_orders_by_model_columns(self):
+        result = self.model.query().select().order_by("number").limit(2).execute()
+        self.assertEqual([row[1] for row in result], ["0-0", "0-1"])
+
+    def test_fan_out_aggregates(self):
+        result = (
+            self.model.query()
+            .select("COUNT(*)", "SUM(amount)", "MIN(amount)", "MAX(amount)")
+            .execute()
+        )
+        self.assertEqual(result, [(12, 306.0, 0.0, 51.0)])
+
+    def test_fan_out_group_by(self):
+        Base.engine.execute("UPDATE Invoice SET number = 'x'")
+        result = (
+            self.model.query()
+            .select("number", "COUNT(*) AS total")
+            .group_by("number")
+            .execute()
+        )
+        self.assertEqual(result, [("x", 12)])
+
+    def test_fan_out_rejects_avg_and_having(self):
+        with self.assertRaises(ValueError):
+            self.model.query().select("AVG(amount)").execute()
+        with self.assertRaises(ValueError):
+            self.model.query().select("number").group_by("number").having(
+                "COUNT(*) > 1"
+            ).execute()
+
+    def test_order_column_must_be_selected(self):
+        with self.assertRaises(ValueError):
+            self.model.query().select("number").order_by("amount").execute()
+
+    def test_replicated_model_is_read_from_one_shard(self):
+        Base.insert(self.country(code="ES"))
+        Base.insert(self.country(code="FR"))
+
+        for shard in Base.engine.shards:
+            self.assertEqual(shard.execute("SELECT COUNT(*) FROM Country"), [(2,)])
+        result = self.country.query().select("code").order_by("code").execute()
+        self.assertEqual(result, [("ES",), ("FR",)])
+        self.assertEqual(self.country.query().select("COUNT(*)").execute(), [(2,)])
+
+    def test_replicated_upsert_checks_every_shard(self):
+        Base.engine.shards[0].execute("INSERT INTO Country (code) VALUES ('ES')")
+        Base.insert(self.country(code="ES"))
+
+        for shard in Base.engine.shards:
+            self.assertEqual(shard.execute("SELECT code FROM Country"), [("ES",)])
+
+    def test_unsupported_features_are_rejected(self):
+        with self.assertRaises(NotImplementedError):
+            Base.write_behind()
+        with self.assertRaises(NotImplementedError):
+            Base.enable_maintenance()
+        with self.assertRaises(NotImplementedError):
+            self.model.open_blob(1, "number")
+        with self.assertRaises(NotImplementedError):
+            with Base.engine.transaction():
+                pass
+
+    def test_summary_tables_are_rejected_before_creating_tables(self):
+        class Refund(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            tenant_id = Column("tenant_id", Integer, nullable=False)
+
+        class RefundTotals(Summary):
+            source = Refund
+            group_by = ("tenant_id",)
+
+        try:
+            with self.assertRaises(NotImplementedError):
+                Base.create_tables()
+        finally:
+            Summary.__registry__.clear()
+        for shard in Base.engine.shards:
+            self.assertEqual(
+                shard.execute("SELECT name FROM sqlite_master WHERE name = 'Refund'"),
+                [],
+            )
+
+    def test_replicas_and_plans_are_rejected(self):
+        with self.assertRaises(NotImplementedError):
+            Base.pin_in_memory(self.country)
+        self.assertIsNone(Base.engine.replica)
+        for shard in Base.engine.shards:
+            self.assertEqual(shard.execute("PRAGMA database_list")[1:], [])
+        with self.assertRaises(NotImplementedError):
+            Base.enable_index_advisor()
+        with self.assertRaises(ValueError):
+            self.model.query().select().explain()
+
+    def test_change_feeds_are_rejected(self):
+        class Ledger(Base, changelog=True):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            tenant_id = Column("tenant_id", Integer, nullable=False)
+
+        with self.assertRaises(NotImplementedError):
+            list(Ledger.changes())
+        with self.assertRaises(NotImplementedError):
+            Ledger.change_seq()
+        with self.assertRaises(NotImplementedError):
+            Ledger.acknowledge_changes(1)
+        with self.assertRaises(NotImplementedError):
+            Ledger.compact_changes()
+
+
+class TestRouting(unittest.TestCase):
+    def test_hash_router_is_stable(self):
+        self.assertEqual(hash_router("tenant-a", 4), hash_router("tenant-a", 4))
+        self.assertTrue(0 <= hash_router("tenant-a", 4) < 4)
+
+    def test_invalid_router_result(self):
+        engine = ShardedEngine([":memory:"], "tenant_id", lambda value, n: 5)
+        with self.assertRaises(IndexError):
+            engine.route(1)
+        engine.close()
+
+    def test_requires_databases(self):
+        with self.assertRaises(ValueError):
+            ShardedEngine([], "tenant_id")
@@ -0,0 +1,97 @@
+import unittest
+
+from flamel.base import Base
+from flamel.column import Column, Integer, Real, String
+from flamel.summary import Summary
+
+
+class TestSummary(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+        Summary.__registry__.clear()
+
+        class Sale(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            day = Column("day", String, nullable=False)
+            amount = Column("amount", Real)
+
+        class DailyTotals(Summary):
+            source = Sale
+            group_by = ("day",)
+            sums = ("amount",)
+
+        self.sale = Sale
+        self.totals = DailyTotals
+        Base.set_engine(":memory:")
+        Base.create_tables()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+        Summary.__registry__.clear()
+
+    def add(self, day, amount):
+        Base.engine.execute(
+            "INSERT INTO Sale (day, amount) VALUES (?, ?)", [day, amount]
+        )
+
+    def test_ddl(self):
+        self.assertEqual(
+            self.totals.ddl()[0],
+            "CREATE TABLE IF NOT EXISTS DailyTotals (day TEXT, "
+            "sum_amount REAL NOT NULL DEFAULT 0, row_count INTEGER NOT NULL DEFAULT 0, "
+            "PRIMARY KEY (day));",
+        )
+
+    def test_insert_trigger(self):
+        self.add("2024-01-01", 10.0)
+        self.add("2024-01-01", 5.5)
+        self.add("2024-01-02", 1.0)
+        self.assertEqual(self.totals.get(day="2024-01-01"), ("2024-01-01", 15.5, 2))
+        self.assertEqual(self.totals.get(day="2024-01-02"), ("2024-01-02", 1.0, 1))
+
+    def test_update_trigger_moves_groups(self):
+        self.add("2024-01-01", 10.0)
+        self.add("2024-01-01", 5.0)
+        Base.engine.execute("UPDATE Sale SET day = '2024-01-02' WHERE amount = 5.0")
+        self.assertEqual(self.totals.get(day="2024-01-01"), ("2024-01-01", 10.0, 1))
+        self.assertEqual(self.totals.get(day="2024-01-02"), ("2024-01-02", 5.0, 1))
+
+    def test_delete_trigger_removes_empty_groups(self):
+        self.add("2024-01-01", 10.0)
+        Base.engine.execute("DELETE FROM Sale")
+        self.assertIsNone(self.totals.get(day="2024-01-01"))
+
+    def test_rebuild(self):
+        self.add("2024-01-01", 10.0)
+        self.add("2024-01-01", None)
+        Base.engine.execute("DELETE FROM DailyTotals")
+        self.totals.rebuild()
+        self.assertEqual(self.totals.get(day="2024-01-01"), ("2024-01-01", 10.0, 2))
+
+    def test_create_table_fills_from_existing_rows(self):
+        Base.engine.execute("DROP TABLE DailyTotals")
+        for trigger in ("ai", "ad", "au"):
+            Base.engine.execute(f"DROP TRIGGER DailyTotals_{trigger}")
+        self.add("2024-01-01", 10.0)
+        self.add("2024-01-01", 2.5)
+
+        self.totals.create_table()
+        self.assertEqual(self.totals.get(day="2024-01-01"), ("2024-01-01", 12.5, 2))
+
+        self.totals.create_table()
+        self.assertEqual(self.totals.get(day="2024-01-01"), ("2024-01-01", 12.5, 2))
+
+    def test_cached_summary_is_invalidated_by_source_writes(self):
+        self.add("2024-01-01", 10.0)
+        query = self.totals.query().select("sum_amount").cached()
+        self.assertEqual(query.execute(), [(10.0,)])
+        self.add("2024-01-01", 2.0)
+        query = self.totals.query().select("sum_amount").cached()
+        self.assertEqual(query.execute(), [(12.0,)])
+
+    def test_missing_source(self):
+        with self.assertRaises(TypeError):
+
+            class Invalid(Summary):
+                group_by = ("day",)
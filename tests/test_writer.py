@@ -0,0 +1,142 @@
+import queue
+import threading
+import unittest
+from unittest.mock import patch
+
+from flamel.base import Base
+from flamel.column import Column, Integer, String
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        Base.__registry__.clear()
+
+        class Event(Base):
+            id = Column("id", Integer, primary_key=True, autoincrement=True)
+            name = Column("name", String, nullable=False, unique=True)
+
+        self.model = Event
+        Base.set_engine(":memory:")
+        Base.create_tables()
+
+    def tearDown(self):
+        Base.engine_close()
+        Base.__registry__.clear()
+
+    def count(self):
+        return Base.engine.execute("SELECT COUNT(*) FROM Event")[0][0]
+
+    def test_concurrent_producers(self):
+        with Base.write_behind(batch_size=50) as writer:
+            futures = []
+            lock = threading.Lock()
+
+            def produce(offset):
+                for i in range(100):
+                    future = writer.submit(self.model(name=f"event-{offset}-{i}"))
+                    with lock:
+                        futures.append(future)
+
+            threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            writer.flush()
+
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertIsNone(futures[0].result())
+        self.assertEqual(self.count(), 400)
+
+    def test_failed_write_does_not_abort_batch(self):
+        with Base.write_behind(flush_interval=0.5) as writer:
+            first = writer.submit(self.model(name="first"))
+            second = writer.submit(self.model(name=None))
+            third = writer.submit(self.model(name="third"))
+            writer.flush()
+
+        self.assertIsNone(first.result())
+        self.assertIsInstance(second.exception(), Exception)
+        self.assertIsNone(third.result())
+        self.assertEqual(self.count(), 2)
+
+    def test_backpressure_when_queue_is_full(self):
+        writer = Base.write_behind(max_queue=1, batch_size=1)
+        with Base.engine.lock:
+            writer.submit(self.model(name="a"), timeout=1)
+            writer.submit(self.model(name="b"), timeout=1)
+            with self.assertRaises(queue.Full):
+                writer.submit(self.model(name="c"), timeout=0.05)
+        writer.close()
+        self.assertEqual(self.count(), 2)
+
+    def test_submit_after_close(self):
+        writer = Base.write_behind()
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.submit(self.model(name="late"))
+
+    def test_unexpected_batch_error_fails_futures_and_keeps_running(self):
+        writer = Base.write_behind(batch_size=1)
+        with patch.object(writer, "_write_batch", side_effect=RuntimeError("boom")):
+            failed = writer.submit(self.model(name="a"))
+            writer.flush()
+        ok = writer.submit(self.model(name="b"))
+        writer.close()
+
+        self.assertIsInstance(failed.exception(timeout=1), RuntimeError)
+        self.assertIsNone(ok.result(timeout=1))
+        self.assertEqual(self.count(), 1)
+
+    def test_submit_racing_close_never_strands_futures(self):
+        writer = Base.write_behind(batch_size=10)
+        futures = []
+        rejected = []
+
+        def produce(offset):
+            for i in range(50):
+                try:
+                    futures.append(writer.submit(self.model(name=f"{offset}-{i}")))
+                except RuntimeError:
+                    rejected.append(i)
+
+        threads = [threading.Thread(target=produce, args=(n,)) for n in range(4)]
+        for thread in threads:
+            thread.start()
+        writer.close()
+        for thread in threads:
+            thread.join()
+
+        for future in futures:
+            self.assertIsNone(future.result(timeout=1))
+        self.assertEqual(len(futures) + len(rejected), 200)
+        self.assertEqual(self.count(), len(futures))
+
+    def test_invalid_batch_size(self):
+        with self.assertRaises(ValueError):
+            Base.write_behind(batch_size=0)
+
+
+class TestTransaction(unittest.TestCase):
+    def setUp(self):
+        Base.set_engine(":memory:")
+        Base.engine.execute("CREATE TABLE t (x INTEGER UNIQUE)")
+
+    def tearDown(self):
+        Base.engine_close()
+
+    def test_transaction_rollback(self):
+        with self.assertRaises(RuntimeError):
+            with Base.engine.transaction() as engine:
+                engine.execute("INSERT INTO t VALUES (1)")
+                raise RuntimeError()
+        self.assertEqual(Base.engine.execute("SELECT COUNT(*) FROM t"), [(0,)])
+
+    def test_savepoint_rollback_keeps_transaction(self):
+        with Base.engine.transaction() as engine:
+            engine.execute("INSERT INTO t VALUES (1)")
+            with self.assertRaises(Exception):
+                with engine.savepoint():
+                    engine.execute("INSERT INTO t VALUES (1)")
+            engine.execute("INSERT INTO t VALUES (2)")
+        self.assertEqual(Base.engine.execute("SELECT COUNT(*) FROM t"), [(2,)])